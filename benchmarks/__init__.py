@@ -0,0 +1,28 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Parse and write throughput benchmarks on synthetic files.
+
+No game assets and no Blender needed, run from the repository root:
+
+    python -m benchmarks --save before.json
+    python -m benchmarks --baseline before.json
+
+synthetic   generators for SKN, SKL, ANM and SCO files of any size
+run         the benchmark cases, JSON report and baseline comparison
+"""
@@ -0,0 +1,276 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Runs the benchmark cases and compares them against a baseline.
+
+    python -m benchmarks [--vertices N] [--bones N] [--frames N]
+                         [--repeat N] [-k FILTER]
+                         [--save OUT.json] [--baseline OLD.json]
+
+Every case is timed --repeat times on the same synthetic file, the best
+time gives MB/s and records/s (vertices, bones or bone frames).  Peak
+memory is measured in one extra run under tracemalloc, so the timed runs
+are not slowed down by it.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from io_scene_lol import lolMesh, lolSkeleton, lolAnimation
+from . import synthetic
+
+class benchCase():
+    '''One timed operation.  setup(workDir) creates its input and returns
+    (args, numBytes, numRecords), run(*args) is what gets timed.'''
+    def __init__(self, name, setup, run):
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+def _fileInput(make, **kwargs):
+    '''setup for the parser cases: writes the file, the parser reads it'''
+    def setup(workDir, config):
+        path = os.path.join(workDir, make.__name__ + '-%d' % len(os.listdir(workDir)))
+        counts = make(path, **dict(kwargs, **config.get(make.__name__, {})))
+        numRecords = counts.get('numVertices') or \
+                counts['numBones'] * counts.get('numFrames', 1)
+        return (path,), os.path.getsize(path), numRecords
+    return setup
+
+def _parsedInput(make, parse, **kwargs):
+    '''setup for the writer cases: the writer gets the parsed file'''
+    fileSetup = _fileInput(make, **kwargs)
+    def setup(workDir, config):
+        (path,), numBytes, numRecords = fileSetup(workDir, config)
+        parsed = parse(path)
+        return parsed, numBytes, numRecords
+    return setup
+
+def _writeSKN(header, materials, metaData, mesh):
+    lolMesh.writeSKN(io.BytesIO(), header, metaData, mesh)
+
+def _writePLY(header, materials, metaData, mesh):
+    lolMesh.writePLY(io.BytesIO(), mesh)
+
+def _writeOBJ(header, materials, metaData, mesh):
+    lolMesh.writeOBJ(io.StringIO(), mesh)
+
+def _writeSKL(header, skeleton, boneIds):
+    lolSkeleton.writeSKL(io.BytesIO(), header, skeleton, boneIds)
+
+def _indexSKL(header, skeleton, boneIds):
+    lolSkeleton.SkeletonIndex.fromSkeleton(skeleton)
+
+def _armatureBones(header, skeleton, boneIds):
+    lolSkeleton.armatureBones(skeleton)
+
+def _writeANM(header, boneList):
+    anmFid = io.BytesIO()
+    header.toFile(anmFid)
+    for bone in boneList:
+        bone.toFile(anmFid, header.version)
+
+def _mapSKN(path):
+    with lolMesh.sknMappedFile(path) as skn:
+        skn.toMesh()
+
+def benchCases():
+    '''Every benchmark case, in report order'''
+    cases = []
+    for version in [0, 1, 2, 4]:
+        cases.append(benchCase('importSKN/v%d' % version,
+                _fileInput(synthetic.makeSKN, version=version), lolMesh.importSKN))
+    cases.append(benchCase('importSKN/v4-color',
+            _fileInput(synthetic.makeSKN, version=4, vertexColors=True),
+            lolMesh.importSKN))
+    cases.append(benchCase('sknMappedFile/v4',
+            _fileInput(synthetic.makeSKN, version=4), _mapSKN))
+    cases.append(benchCase('peekSKN/v4',
+            _fileInput(synthetic.makeSKN, version=4), lolMesh.peekSKN))
+    for version in [0, 1, 2]:
+        cases.append(benchCase('importSKL/v%d' % version,
+                _fileInput(synthetic.makeSKL, version=version),
+                lolSkeleton.importSKL))
+    for version in [0, 2, 3]:
+        cases.append(benchCase('importANM/v%d' % version,
+                _fileInput(synthetic.makeANM, version=version),
+                lolAnimation.importANM))
+    cases.append(benchCase('importSCO',
+            _fileInput(synthetic.makeSCO), lolMesh.importSCO))
+
+    for version, colors in [(0, False), (1, False), (2, False), (4, False), (4, True)]:
+        cases.append(benchCase('writeSKN/v%d%s' % (version, '-color' if colors else ''),
+                _parsedInput(synthetic.makeSKN, lolMesh.importSKN,
+                    version=version, vertexColors=colors), _writeSKN))
+    cases.append(benchCase('writePLY/v4',
+            _parsedInput(synthetic.makeSKN, lolMesh.importSKN, version=4),
+            _writePLY))
+    cases.append(benchCase('writeOBJ/v4',
+            _parsedInput(synthetic.makeSKN, lolMesh.importSKN, version=4),
+            _writeOBJ))
+    for version in [1, 2]:
+        cases.append(benchCase('writeSKL/v%d' % version,
+                _parsedInput(synthetic.makeSKL, lolSkeleton.importSKL,
+                    version=version), _writeSKL))
+    for version in [0, 2]:
+        cases.append(benchCase('SkeletonIndex/v%d' % version,
+                _parsedInput(synthetic.makeSKL, lolSkeleton.importSKL,
+                    version=version), _indexSKL))
+        cases.append(benchCase('armatureBones/v%d' % version,
+                _parsedInput(synthetic.makeSKL, lolSkeleton.importSKL,
+                    version=version), _armatureBones))
+    cases.append(benchCase('writeANM/v3',
+            _parsedInput(synthetic.makeANM, lolAnimation.importANM, version=3),
+            _writeANM))
+    return cases
+
+def runCase(case, workDir, config, repeat=5):
+    '''Times one case, returns its result dict'''
+    result = {'status': 'ok'}
+    try:
+        args, numBytes, numRecords = case.setup(workDir, config)
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            case.run(*args)
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            case.run(*args)
+            peakBytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        result['status'] = 'error'
+        result['reason'] = '%s: %s' % (type(e).__name__, e)
+        return result
+
+    best = min(times)
+    result.update({'bytes': numBytes,
+            'records': numRecords,
+            'seconds': best,
+            'medianSeconds': float(np.median(times)),
+            'mbPerSecond': numBytes / 1e6 / best if best > 0 else None,
+            'recordsPerSecond': numRecords / best if best > 0 else None,
+            'peakBytes': peakBytes})
+    return result
+
+def runAll(config, repeat=5, caseFilter=None, progress=None):
+    '''Runs every case whose name contains caseFilter and returns the report'''
+    report = {'meta': {'python': platform.python_version(),
+                    'numpy': np.__version__,
+                    'platform': platform.platform(),
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'repeat': repeat,
+                    'config': config},
+            'results': {}}
+    with tempfile.TemporaryDirectory(prefix='lolbench-') as workDir:
+        for case in benchCases():
+            if caseFilter and caseFilter not in case.name:
+                continue
+            report['results'][case.name] = runCase(case, workDir, config, repeat)
+            if progress is not None:
+                progress(case.name, report['results'][case.name])
+    return report
+
+def compare(report, baseline, threshold=0.1):
+    '''Returns {name: (baseline MB/s, MB/s, ratio)} of the cases in both, and
+    the names of the ones more than threshold slower'''
+    comparison = {}
+    regressions = []
+    for name, result in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if result['status'] != 'ok' or not old or old.get('status') != 'ok':
+            continue
+        ratio = result['mbPerSecond'] / old['mbPerSecond']
+        comparison[name] = (old['mbPerSecond'], result['mbPerSecond'], ratio)
+        if ratio < 1 - threshold:
+            regressions.append(name)
+    return comparison, regressions
+
+def printReport(report, comparison=None, out=sys.stdout):
+    comparison = comparison or {}
+    out.write("%-22s %10s %14s %10s %8s\n" % ('case', 'MB/s', 'records/s',
+            'peak MB', 'vs base'))
+    for name, result in report['results'].items():
+        if result['status'] != 'ok':
+            out.write("%-22s %s (%s)\n" % (name, result['status'], result['reason']))
+            continue
+        versus = '%.2fx' % comparison[name][2] if name in comparison else ''
+        out.write("%-22s %10.1f %14.0f %10.1f %8s\n" % (name,
+                result['mbPerSecond'], result['recordsPerSecond'],
+                result['peakBytes'] / 1e6, versus))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+            description='Parse and write throughput on synthetic files')
+    parser.add_argument('--vertices', type=int, default=20000,
+            help='vertices per SKN file (at most 65536)')
+    parser.add_argument('--bones', type=int, default=100,
+            help='bones per SKL and ANM file')
+    parser.add_argument('--frames', type=int, default=300,
+            help='frames per ANM file')
+    parser.add_argument('--sco-vertices', type=int, default=5000,
+            help='vertices per SCO file')
+    parser.add_argument('--repeat', type=int, default=5,
+            help='timed runs per case, the best one counts')
+    parser.add_argument('-k', '--filter', default=None,
+            help='only run cases whose name contains this')
+    parser.add_argument('--save', default=None,
+            help='write the JSON report to this file')
+    parser.add_argument('--baseline', default=None,
+            help='JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+            help='relative slowdown that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true',
+            help='exit with 1 if any case regressed')
+    args = parser.parse_args(argv)
+
+    config = {'makeSKN': {'numVertices': args.vertices},
+            'makeSKL': {'numBones': args.bones},
+            'makeANM': {'numBones': args.bones, 'numFrames': args.frames},
+            'makeSCO': {'numVertices': args.sco_vertices}}
+
+    def progress(name, result):
+        sys.stderr.write("%s: %s\n" % (name, result['status']))
+
+    report = runAll(config, args.repeat, args.filter, progress)
+
+    comparison = regressions = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison, regressions = compare(report, json.load(f), args.threshold)
+        report['baseline'] = {'path': args.baseline, 'regressions': regressions,
+                'ratios': {name: c[2] for name, c in comparison.items()}}
+    printReport(report, comparison)
+    if regressions:
+        sys.stdout.write("regressions: %s\n" % ', '.join(regressions))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=1)
+    return 1 if regressions and args.fail_on_regression else 0
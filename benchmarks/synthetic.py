@@ -0,0 +1,207 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Generators for synthetic League of Legends files.
+
+The files follow the layouts documented in lolMesh, lolSkeleton and
+lolAnimation byte for byte, with random but valid contents: unit
+quaternions and orthonormal bone matrices, normalized weights, in range
+indices and parents that come before their children.  A fixed seed gives
+identical files.
+"""
+import struct
+
+import numpy as np
+
+from io_scene_lol import lolMesh
+
+SKN_MAGIC = 0x00112233
+
+def _rotations(rng, n):
+    '''n random unit quaternions as (x, y, z, w)'''
+    quats = rng.normal(size=(n, 4))
+    return quats / np.linalg.norm(quats, axis=1, keepdims=True)
+
+def _matrices(quats):
+    '''Rotation matrices [n, 3, 3] of (x, y, z, w) quaternions'''
+    x, y, z, w = quats.T
+    return np.stack([
+        np.stack([1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)], -1),
+        np.stack([2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)], -1),
+        np.stack([2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)], -1),
+        ], 1)
+
+def _parents(rng, numBones):
+    '''Random bone hierarchy, every parent comes before its children'''
+    parents = np.full(numBones, -1, dtype=np.int32)
+    for k in range(1, numBones):
+        parents[k] = rng.integers(0, k)
+    return parents
+
+def boneNames(numBones):
+    return ['bone_%03d' % k for k in range(numBones)]
+
+def makeSKN(path, version=4, numVertices=20000, numMaterials=2,
+        vertexColors=False, seed=0):
+    '''Writes a SKN file with numVertices vertices and about two triangles
+    per vertex, split evenly over numMaterials materials (1 for v0)'''
+    if numVertices > 65536:
+        raise ValueError("SKN indices are 16 bit, at most 65536 vertices")
+    if vertexColors and version != 4:
+        raise ValueError("Only v4 SKN files have vertex colors")
+    rng = np.random.default_rng(seed)
+    if version == 0:
+        numMaterials = 1
+    numFaces = 2 * numVertices
+    numIndices = 3 * numFaces
+
+    #each material owns a contiguous range of vertices and triangles
+    vertexStarts = np.linspace(0, numVertices, numMaterials + 1).astype(int)
+    faceStarts = np.linspace(0, numFaces, numMaterials + 1).astype(int)
+    indices = np.empty(numIndices, dtype=lolMesh.sknIndexDtype)
+    for m in range(numMaterials):
+        faces = slice(3 * faceStarts[m], 3 * faceStarts[m + 1])
+        indices[faces] = rng.integers(vertexStarts[m], vertexStarts[m + 1],
+                size=indices[faces].shape)
+
+    dtype = lolMesh.sknVertexDtype56 if vertexColors else lolMesh.sknVertexDtype52
+    vertices = np.zeros(numVertices, dtype=dtype)
+    vertices['position'] = rng.normal(scale=50.0, size=(numVertices, 3))
+    vertices['boneIndex'] = rng.integers(0, 64, size=(numVertices, 4))
+    weights = rng.random((numVertices, 4))
+    vertices['weights'] = weights / weights.sum(axis=1, keepdims=True)
+    normals = rng.normal(size=(numVertices, 3))
+    vertices['normal'] = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    vertices['texcoords'] = rng.random((numVertices, 2))
+    if vertexColors:
+        vertices['vertexColor'] = rng.integers(0, 256, size=(numVertices, 4))
+
+    data = [struct.pack('<i2h', SKN_MAGIC, version, 1)]
+    if version == 0:
+        data.append(struct.pack('<2I', numIndices, numVertices))
+    else:
+        data.append(struct.pack('<i', numMaterials))
+        for m in range(numMaterials):
+            data.append(struct.pack('<64s4i', ('material_%d' % m).encode(),
+                    vertexStarts[m], vertexStarts[m + 1] - vertexStarts[m],
+                    3 * faceStarts[m], 3 * (faceStarts[m + 1] - faceStarts[m])))
+    if version in [1, 2]:
+        data.append(struct.pack('<2i', numIndices, numVertices))
+    elif version == 4:
+        positions = vertices['position']
+        boxMin = positions.min(axis=0)
+        boxMax = positions.max(axis=0)
+        center = (boxMin + boxMax) / 2
+        radius = np.linalg.norm(positions - center, axis=1).max()
+        data.append(struct.pack('<3iIi10f', 0, numIndices, numVertices,
+                dtype.itemsize, int(vertexColors), *boxMin, *boxMax, *center,
+                radius))
+    data.append(indices.tobytes())
+    data.append(vertices.tobytes())
+    if version >= 2:
+        data.append(struct.pack('<3i', 0, 0, 0))
+
+    with open(path, 'wb') as f:
+        f.write(b''.join(data))
+    return {'numVertices': numVertices, 'numIndices': numIndices}
+
+def makeSKL(path, version=2, numBones=100, seed=0):
+    '''Writes a SKL file with numBones bones.  v2 files list every other
+    bone in the reordered bone list, v0 files all of them.'''
+    rng = np.random.default_rng(seed)
+    names = boneNames(numBones)
+    parents = _parents(rng, numBones)
+    quats = _rotations(rng, numBones)
+    positions = rng.normal(scale=10.0, size=(numBones, 3))
+
+    if version in [1, 2]:
+        matrices = np.concatenate([_matrices(quats), positions[:, :, None]], axis=2)
+        data = [struct.pack('<8si', b'r3d2sklt', version),
+                struct.pack('<2i', 0x5eed, numBones)]
+        for k in range(numBones):
+            data.append(struct.pack('<32sif12f', names[k].encode(),
+                    parents[k], 0.1, *matrices[k].ravel()))
+        if version == 2:
+            boneIDs = np.arange(0, numBones, 2, dtype='<i4')
+            data.append(struct.pack('<i', len(boneIDs)))
+            data.append(boneIDs.tobytes())
+    elif version == 0:
+        boneOffset = 64
+        idMapOffset = boneOffset + 100 * numBones
+        animationIndexOffset = idMapOffset + 8 * numBones
+        stringOffset = animationIndexOffset + 2 * numBones
+        stringOffset += -stringOffset % 4
+        data = [struct.pack('<8si', b'r3d2sklt', 0),
+                struct.pack('<2hi2h5i', 0, numBones, numBones, boneOffset, 0,
+                    idMapOffset, animationIndexOffset, 0, 0, stringOffset)]
+        data.append(b'\0' * (boneOffset - len(b''.join(data))))
+        for k in range(numBones):
+            data.append(struct.pack('<4hi22f', 0, k, parents[k], 0,
+                    0x1234 + k, 2.1, *positions[k], 1.0, 1.0, 1.0, *quats[k],
+                    *positions[k], *np.zeros(8)))
+        data.append(np.stack([np.arange(numBones)] * 2, 1).astype('<i4').tobytes())
+        data.append(np.arange(numBones, dtype='<i2').tobytes())
+        data.append(b'\0' * (stringOffset - animationIndexOffset - 2 * numBones))
+        for name in names:
+            raw = name.encode() + b'\0'
+            data.append(raw + b'\0' * (-len(raw) % 4))
+    else:
+        raise ValueError("Version %s SKL not supported" % version)
+
+    with open(path, 'wb') as f:
+        f.write(b''.join(data))
+    return {'numBones': numBones}
+
+def makeANM(path, version=3, numBones=100, numFrames=300, fps=30, seed=0):
+    '''Writes a v0, v2 or v3 ANM file, bones named like makeSKL's'''
+    if version not in [0, 2, 3]:
+        raise ValueError("Version %s ANM not supported" % version)
+    rng = np.random.default_rng(seed)
+    frameDtype = np.dtype([('orientation', '<f4', (4,)), ('position', '<f4', (3,))])
+    data = [struct.pack('<8si', b'r3d2anmd', version),
+            struct.pack('<4i', 0x5eed, numBones, numFrames, fps)]
+    for k, name in enumerate(boneNames(numBones)):
+        data.append(struct.pack('<32si', name.encode(), 0 if k else 2))
+        frames = np.empty(numFrames, dtype=frameDtype)
+        frames['orientation'] = _rotations(rng, numFrames)
+        frames['position'] = rng.normal(scale=10.0, size=(numFrames, 3))
+        data.append(frames.tobytes())
+
+    with open(path, 'wb') as f:
+        f.write(b''.join(data))
+    return {'numBones': numBones, 'numFrames': numFrames}
+
+def makeSCO(path, numVertices=5000, seed=0):
+    '''Writes a SCO particle mesh with numVertices vertices and as many
+    triangles'''
+    rng = np.random.default_rng(seed)
+    positions = rng.normal(scale=50.0, size=(numVertices, 3))
+    faces = rng.integers(0, numVertices, size=(numVertices, 3))
+    uvs = rng.random((numVertices, 6))
+
+    lines = ['[ObjectBegin]', 'Name= synthetic', 'CentralPoint= 0.0 0.0 0.0',
+            'Verts= %d' % numVertices]
+    lines.extend('%f %f %f' % tuple(p) for p in positions.tolist())
+    lines.append('Faces= %d' % numVertices)
+    lines.extend('3 %d %d %d material_0 %f %f %f %f %f %f' % (tuple(f) + tuple(uv))
+            for f, uv in zip(faces.tolist(), uvs.tolist()))
+    lines.append('[ObjectEnd]')
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return {'numVertices': numVertices, 'numFaces': numVertices}
@@ -21,34 +21,45 @@ import builtins
 import bpy
 import struct
 import os
+from collections import OrderedDict
 from bpy.types import Material
 import bpy.utils.previews
 from bpy import props
 from bpy_extras.io_utils import ImportHelper, ExportHelper
-from . import lolMesh, lolSkeleton, lolAnimation
+from . import lolMesh, lolSkeleton, lolAnimation, lolBatch, lolCache, lolLog
 from os import cpu_count, path
 
+log = lolLog.getLogger(__name__)
+
+#Material names of recently probed .skn files, keyed by (path, mtime, size).
+#The import dialog asks for them on every redraw.
+MATERIAL_CACHE_SIZE = 64
+_materialCache = OrderedDict()
+
 def findMaterials(fp):
-    f = open(fp, "rb")
-    fmt = '8x'
-    size = struct.calcsize(fmt)
-    f.read(size)
-
-    fmt = '<I'
-    size = struct.calcsize(fmt)
-    meshCount = struct.unpack(fmt, f.read(size))[0]
-
-    m = []
-
-    fmt = '<64s4I'
-    size = struct.calcsize(fmt)
-    for _ in range(meshCount):
-        out = f.read(size)
-        data = struct.unpack(fmt, out)
-        matName = bytes.decode(data[0]).rstrip('\x00')
-        m.append(matName)
-    
-    return m
+    '''Material names of a .skn file, cached until the file changes'''
+    try:
+        st = os.stat(fp)
+    except OSError:
+        return []
+    key = (fp, st.st_mtime_ns, st.st_size)
+    if key in _materialCache:
+        _materialCache.move_to_end(key)
+        return list(_materialCache[key])
+
+    try:
+        m = [mat.name for mat in lolMesh.peekSKN(fp)['materials']]
+    except (OSError, ValueError, struct.error, UnicodeDecodeError):
+        m = []
+    _materialCache[key] = m
+    while len(_materialCache) > MATERIAL_CACHE_SIZE:
+        _materialCache.popitem(last=False)
+    return list(m)
+
+def report_timing(operator):
+    '''Shows the timing summary of the last import or export in the status bar'''
+    if lolLog.lastReport is not None:
+        operator.report({'INFO'}, lolLog.summary(lolLog.lastReport))
 
 __bpydoc__="""
 Import/Export a League of Legends character model, including
@@ -80,6 +91,9 @@ class IMPORT_OT_lol(bpy.types.Operator, ImportHelper):
     IMPORT_TEXTURES = props.BoolProperty(name='ImportTextures', description='Loads the textures for the applied mesh', default=True)
     CLEAR_SCENE = props.BoolProperty(name='ClearScene', description='Clear current scene before importing?', default=True)
     APPLY_WEIGHTS = props.BoolProperty(name='LoadWeights', description='Load default bone weights from .skn file', default=True)
+    SCAN_FOLDERS = props.BoolProperty(name='ScanFolders', description='Import every character in the folder and its subfolders, e.g. all skins of a champion', default=False)
+    SPACING = props.FloatProperty(name='Spacing', description='Distance between characters when importing several side by side', default=250.0, min=0.0)
+    PROFILE = props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
 
     MATERIAL_LIST= []
     TEXTURE_LIST= []
@@ -129,9 +143,25 @@ class IMPORT_OT_lol(bpy.types.Operator, ImportHelper):
         # box.prop(self.properties, 'DDS_FILE')
         box.prop(self.properties, 'CLEAR_SCENE', text='Clear scene before importing')
         box.prop(self.properties, 'APPLY_WEIGHTS', text='Load mesh weights')    
+        box.prop(self.properties, 'SCAN_FOLDERS', text='Import all characters in folder')
+        box.prop(self.properties, 'SPACING')
+        box.prop(self.properties, 'PROFILE')
         
     def execute(self, context):
 
+        #Several meshes or whole folders: parse them all in parallel
+        sknFiles = [f.name for f in self.files
+                if path.splitext(f.name)[-1].lower() == '.skn']
+        if self.SCAN_FOLDERS or len(sknFiles) > 1:
+            import_chars(FILEPATHS=[path.join(self.MODEL_DIR, f.name) for f in self.files],
+                    DIRECTORY=self.MODEL_DIR if self.SCAN_FOLDERS else "",
+                    CLEAR_SCENE=self.CLEAR_SCENE,
+                    APPLY_WEIGHTS=self.APPLY_WEIGHTS,
+                    SPACING=self.SPACING,
+                    PROFILE=self.PROFILE)
+            report_timing(self)
+            return {'FINISHED'}
+
         if(self.IMPORT_TEXTURES) and self.MATERIAL_LIST:
             self.TEXTURE_LIST = []
             for i in range(len(self.MATERIAL_LIST)):
@@ -145,7 +175,9 @@ class IMPORT_OT_lol(bpy.types.Operator, ImportHelper):
                     CLEAR_SCENE=self.CLEAR_SCENE,
                     APPLY_WEIGHTS=self.APPLY_WEIGHTS,
                     IMPORT_TEXTURES=self.IMPORT_TEXTURES,
-                    TEXTURE_LIST=self.TEXTURE_LIST)
+                    TEXTURE_LIST=self.TEXTURE_LIST,
+                    PROFILE=self.PROFILE)
+        report_timing(self)
                
         return {'FINISHED'}
 
@@ -155,6 +187,7 @@ class IMPORT_OT_lolanm(bpy.types.Operator, ImportHelper):
 
     ANM_FILE = props.StringProperty(name='Animation', description='Animation .anm file')
     MODEL_DIR = props.StringProperty()
+    PROFILE = props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
        
     def draw(self, context):
         layout = self.layout
@@ -166,10 +199,13 @@ class IMPORT_OT_lolanm(bpy.types.Operator, ImportHelper):
             self.ANM_FILE = fileProps.filename
         box = layout.box()
         box.prop(self.properties, 'ANM_FILE')
+        box.prop(self.properties, 'PROFILE')
         
     def execute(self, context):
         import_animation(MODEL_DIR=self.MODEL_DIR,
-                    ANM_FILE=self.ANM_FILE)
+                    ANM_FILE=self.ANM_FILE,
+                    PROFILE=self.PROFILE)
+        report_timing(self)
                
         return {'FINISHED'}
 
@@ -181,6 +217,7 @@ class EXPORT_OT_lolanm(bpy.types.Operator, ImportHelper):
     INPUT_FILE = props.StringProperty(name='Import File', description='File to import certain metadata from')
     OVERWRITE_FILE_VERSION = props.BoolProperty(name='Overwrite File Version', description='Write a version different from the imported file', default=False)
     VERSION = props.IntProperty(name='File Version', description='Overwrite file version', default=3)
+    PROFILE = props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
     
     filename_ext = '.anm'
     def draw(self, context):
@@ -198,9 +235,11 @@ class EXPORT_OT_lolanm(bpy.types.Operator, ImportHelper):
         box.prop(self.properties, 'OVERWRITE_FILE_VERSION')
         if self.OVERWRITE_FILE_VERSION:
             box.prop(self.properties, 'VERSION')
+        box.prop(self.properties, 'PROFILE')
         
     def execute(self, context):
-        export_animation(MODEL_DIR=self.MODEL_DIR, OUTPUT_FILE=self.OUTPUT_FILE, INPUT_FILE=self.INPUT_FILE, OVERWRITE_FILE_VERSION=self.OVERWRITE_FILE_VERSION, VERSION=self.VERSION)
+        export_animation(MODEL_DIR=self.MODEL_DIR, OUTPUT_FILE=self.OUTPUT_FILE, INPUT_FILE=self.INPUT_FILE, OVERWRITE_FILE_VERSION=self.OVERWRITE_FILE_VERSION, VERSION=self.VERSION, PROFILE=self.PROFILE)
+        report_timing(self)
         
         return {'FINISHED'}
 
@@ -214,6 +253,9 @@ class EXPORT_OT_lol(bpy.types.Operator, ExportHelper):
     OUTPUT_FILE : props.StringProperty(name='Export File', description='File to which model will be exported')
     BASE_ON_IMPORT : props.BoolProperty(name='Base On Imported SKN', description='Base writing on an imported SKN of choice', default=True)
     INPUT_FILE : props.StringProperty(name='Import File', description='File to import certain metadata from')
+    UV_TOLERANCE : props.FloatProperty(name='UV Weld Tolerance', description='Loops of a vertex whose UVs are closer than this export as one vertex (0 = exact match)', default=0.0, min=0.0, precision=6)
+    POSITION_TOLERANCE : props.FloatProperty(name='Position Weld Tolerance', description='Vertices closer than this export as one vertex (0 = keep all vertices)', default=0.0, min=0.0, precision=6)
+    PROFILE : props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
     MODEL_DIR : props.StringProperty()
 
     filename_ext = '.skn'
@@ -231,13 +273,20 @@ class EXPORT_OT_lol(bpy.types.Operator, ExportHelper):
         box.prop(self.properties, 'OUTPUT_FILE')
         box.prop(self.properties, 'BASE_ON_IMPORT')
         box.prop(self.properties, 'INPUT_FILE')
+        box.prop(self.properties, 'UV_TOLERANCE')
+        box.prop(self.properties, 'POSITION_TOLERANCE')
+        box.prop(self.properties, 'PROFILE')
         
     def execute(self, context):
         export_char(MODEL_DIR=self.MODEL_DIR,
                 OUTPUT_FILE=self.OUTPUT_FILE,
                 INPUT_FILE=self.INPUT_FILE,
                 BASE_ON_IMPORT=self.BASE_ON_IMPORT,
-                VERSION=self.VERSION)
+                VERSION=self.VERSION,
+                UV_TOLERANCE=self.UV_TOLERANCE,
+                POSITION_TOLERANCE=self.POSITION_TOLERANCE,
+                PROFILE=self.PROFILE)
+        report_timing(self)
 
         return {'FINISHED'}
         
@@ -250,6 +299,7 @@ class EXPORT_OT_skl(bpy.types.Operator, ExportHelper):
     OUTPUT_FILE = props.StringProperty(name='Export File', description='File to which skeleton will be exported')
     INPUT_FILE = props.StringProperty(name='Import File', description='File to import certain metadata from')
     MODEL_DIR = props.StringProperty()
+    PROFILE = props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
 
     filename_ext = '.skl'
     def draw(self, context):
@@ -264,9 +314,11 @@ class EXPORT_OT_skl(bpy.types.Operator, ExportHelper):
         box = layout.box()
         box.prop(self.properties, 'OUTPUT_FILE')
         box.prop(self.properties, 'INPUT_FILE')
+        box.prop(self.properties, 'PROFILE')
         
     def execute(self, context):
-        export_skl(MODEL_DIR=self.MODEL_DIR, OUTPUT_FILE=self.OUTPUT_FILE, INPUT_FILE=self.INPUT_FILE)
+        export_skl(MODEL_DIR=self.MODEL_DIR, OUTPUT_FILE=self.OUTPUT_FILE, INPUT_FILE=self.INPUT_FILE, PROFILE=self.PROFILE)
+        report_timing(self)
 
         return {'FINISHED'}
 
@@ -277,9 +329,11 @@ class IMPORT_OT_sco(bpy.types.Operator, ImportHelper):
     bl_label="Import .sco"
 
     filename_ext = '.sco'
+    PROFILE = props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
 
     def execute(self, context):
-        import_sco(self.properties.filepath)
+        import_sco(self.properties.filepath, PROFILE=self.PROFILE)
+        report_timing(self)
         return {'FINISHED'}
 
 class EXPORT_OT_sco(bpy.types.Operator, ExportHelper): #BilbozZ Class
@@ -289,16 +343,128 @@ class EXPORT_OT_sco(bpy.types.Operator, ExportHelper): #BilbozZ Class
     bl_label="Export .sco"
     
     filename_ext = '.sco'
+    PROFILE = props.BoolProperty(name='Profile', description='Capture a cProfile of the operation and print its timing report to the console', default=False)
     
     def execute(self, context):
-        result = export_sco(self.properties.filepath)
+        result = export_sco(self.properties.filepath, PROFILE=self.PROFILE)
         
         if (result == {'CANCELLED'}):
-            print('No valid mesh is selected')
+            log.error('No valid mesh is selected')
+        else:
+            report_timing(self)
         
         return result
 
-def import_char(MODEL_DIR="", 
+def clear_scene():
+    '''Remove existing meshes, armatures, surfaces, etc.'''
+    for type in ['MESH', 'ARMATURE', 'LATTICE', 'CURVE', 'SURFACE']:
+        bpy.ops.object.select_by_type(extend=False, type=type)
+        bpy.ops.object.delete()
+
+def build_char(character, APPLY_WEIGHTS=True, LOCATION=(0, 0, 0)):
+    '''Builds the Blender objects of an already parsed character
+    (a lolBatch.parsedCharacter).  Returns (meshObj, armObj), either may be
+    None if the character has no mesh or skeleton.
+
+    LOCATION:  where to put the character, e.g. to line up several of them
+    '''
+    meshObj = None
+    armObj = None
+
+    if character.mesh is not None:
+        with lolLog.phase('build', records=character.mesh.numVertices):
+            lolMesh.buildMesh(character.files.sknPath, character.sknHeader,
+                    character.materials, character.metaData, character.mesh)
+            #buildMesh leaves the new object active
+            meshObj = bpy.context.view_layer.objects.active
+            bpy.ops.object.select_all(action='DESELECT')
+            meshObj.select_set(True)
+            bpy.ops.transform.resize(value=(1,1,-1), constraint_axis=(False, False,True), orient_type='GLOBAL')
+            bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
+            bpy.ops.object.shade_smooth()
+            meshObj.location = LOCATION
+
+    if character.skeleton is not None:
+        with lolLog.phase('build', records=len(character.skeleton)):
+            lolSkeleton.buildSKL(character.skeleton)
+            armObj = bpy.context.active_object
+            armObj.name ='lolArmature'
+            armObj.data.display_type = 'STICK'
+            armObj.data.show_axes = True
+            armObj.show_in_front = True
+            armObj.location = LOCATION
+
+    if meshObj is not None and armObj is not None and APPLY_WEIGHTS:
+        with lolLog.phase('weights', records=character.mesh.numVertices):
+            boneNames = character.skeleton.names
+            if len(character.boneIds):
+                log.debug('Using reordered Bone List')
+                boneNames = [boneNames[k] for k in character.boneIds.tolist()]
+            lolMesh.addDefaultWeights(boneNames, character.mesh, armObj, meshObj)
+
+    return meshObj, armObj
+
+def count_parsed(phase, character):
+    '''Adds the file sizes and the vertex and bone counts of a parsed
+    character to a timing phase'''
+    for filepath in [character.files.sknPath, character.files.sklPath]:
+        if filepath and path.isfile(filepath):
+            phase.count(bytes=path.getsize(filepath))
+    if character.mesh is not None:
+        phase.count(records=character.mesh.numVertices)
+    if character.skeleton is not None:
+        phase.count(records=len(character.skeleton))
+
+@lolLog.timedOperation('import_chars')
+def import_chars(FILEPATHS=[],
+                DIRECTORY="",
+                CLEAR_SCENE=True,
+                APPLY_WEIGHTS=True,
+                SPACING=250.0,
+                MAX_WORKERS=None):
+    '''Import many LoL characters side by side, e.g. all skins of a champion
+    FILEPATHS:  .skn and .skl files, paired up per directory
+    DIRECTORY:  instead of FILEPATHS, import every character found in this
+                directory and its subdirectories
+    CLEAR_SCENE: remove existing meshes, armatures, surfaces, etc.
+                 before importing
+    APPLY_WEIGHTS:  Import bone weights from the mesh files
+    SPACING:  distance between the characters along the x axis
+    MAX_WORKERS:  parser processes, defaults to the number of cores
+    PROFILE:  capture a cProfile of the import
+
+    The files are parsed in worker processes, only the Blender objects are
+    built here.  Returns the (meshObj, armObj) of every character.
+    '''
+    if DIRECTORY:
+        characters = lolBatch.findCharacterFiles(DIRECTORY)
+    else:
+        characters = lolBatch.pairCharacterFiles(FILEPATHS)
+
+    if CLEAR_SCENE:
+        clear_scene()
+
+    with lolLog.phase('parse') as p:
+        parsed = lolBatch.parseCharacters(characters, MAX_WORKERS)
+        for character in parsed:
+            count_parsed(p, character)
+    imported = []
+    for character in parsed:
+        if character.error is not None:
+            log.warning("Skipping %s: %s", character.files.name, character.error)
+            continue
+        meshObj, armObj = build_char(character, APPLY_WEIGHTS,
+                LOCATION=(len(imported) * SPACING, 0, 0))
+        #name the objects after their files to tell them apart
+        if meshObj is not None:
+            meshObj.name = character.files.name
+        if armObj is not None:
+            armObj.name = character.files.name + '_armature'
+        imported.append((meshObj, armObj))
+    return imported
+
+@lolLog.timedOperation('import_char')
+def import_char(MODEL_DIR="",
                 SKN_FILE="", 
                 SKL_FILE="", 
                 # DDS_FILE="",
@@ -317,6 +483,7 @@ def import_char(MODEL_DIR="",
                  before importing
     APPLY_WEIGHTS:  Import bone weights from the mesh file
     APPLY_TEXTURE:  Apply the skin texture
+    PROFILE:  capture a cProfile of the import
 
     !!IMPORTANT!!:
     If you're running this on a windows system make sure
@@ -327,103 +494,83 @@ def import_char(MODEL_DIR="",
     '''
 
     if CLEAR_SCENE:
-        for type in ['MESH', 'ARMATURE', 'LATTICE', 'CURVE', 'SURFACE']:
-            bpy.ops.object.select_by_type(extend=False, type=type)
-            bpy.ops.object.delete()
-
-    if SKN_FILE:
-        SKN_FILEPATH=path.join(MODEL_DIR, SKN_FILE)
-        sknHeader, materials, metaData, indices, vertices = lolMesh.importSKN(SKN_FILEPATH)
-        lolMesh.buildMesh(SKN_FILEPATH,sknHeader, materials, metaData, indices, vertices)
-        meshObj = bpy.data.objects['lolMesh']
-        bpy.ops.object.select_all(action='DESELECT')
-        meshObj.select_set(True)
-        bpy.ops.transform.resize(value=(1,1,-1), constraint_axis=(False, False,True), orient_type='GLOBAL')
-        bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
-        bpy.ops.object.shade_smooth()
-
-        #meshObj.name = 'lolMesh'
-        #Presently io_scene_obj.load() does not import vertex normals, 
-        #so do it ourselves
-        #for id, vtx in enumerate(meshObj.data.vertices):
-        #   vtx.normal = vertices[id]['normal']
-        
-    if SKL_FILE:
-        SKL_FILEPATH=path.join(MODEL_DIR, SKL_FILE)
-        #sklHeader, boneDict = lolSkeleton.importSKL(SKL_FILEPATH)
-        sklHeader, boneList, reorderedBoneList = lolSkeleton.importSKL(SKL_FILEPATH)
-        lolSkeleton.buildSKL(boneList, sklHeader.version)
-        armObj = bpy.data.objects['Armature']
-        armObj.name ='lolArmature'
-        armObj.data.display_type = 'STICK'
-        armObj.data.show_axes = True
-        armObj.show_in_front = True
-
-    if SKN_FILE and SKL_FILE and APPLY_WEIGHTS:
-        if reorderedBoneList == []:
-           lolMesh.addDefaultWeights(boneList, vertices, armObj, meshObj)
-        else:
-           print('Using reordered Bone List')
-           lolMesh.addDefaultWeights(reorderedBoneList, vertices, armObj, meshObj)
-        
-    if APPLY_TEXTURE and IMPORT_TEXTURES:
+        clear_scene()
+
+    files = lolBatch.characterFiles(
+            path.join(MODEL_DIR, SKN_FILE) if SKN_FILE else None,
+            path.join(MODEL_DIR, SKL_FILE) if SKL_FILE else None)
+    with lolLog.phase('parse') as p:
+        character = lolBatch.parseCharacter(files)
+        count_parsed(p, character)
+    if character.error is not None:
+        raise character.error
+    meshObj, armObj = build_char(character, APPLY_WEIGHTS)
+
+    if APPLY_TEXTURE and IMPORT_TEXTURES and meshObj is not None:
         try:  # in case user is already in object mode (ie, SKN and DDS but no SKL)
             bpy.ops.object.mode_set(mode='OBJECT')
         except RuntimeError:
             pass
         bpy.ops.object.select_all(action='DESELECT')
 
-        for i, mat in enumerate(meshObj.data.materials):
-
-            # bpy.ops.scene.__loader__()
-
-            # ImportHelper
-
-            texImage = mat.node_tree.nodes['Image Texture']
-            try:
-                texImage.image = bpy.data.images.load(path.join(MODEL_DIR, TEXTURE_LIST[i]))
-            except RuntimeError as e:
-                print('Image not found or selected')
-            except TypeError as e:
-                pass
-
-            # setting the render to flat textures and closet to league of legends
-            for area in bpy.context.screen.areas: 
-                if area.type == 'VIEW_3D':
-                    for space in area.spaces: 
-                        if space.type == 'VIEW_3D':
-                            space.shading.type = 'SOLID'
-                            space.shading.light = 'FLAT'
-                            space.shading.color_type = 'TEXTURE'
-                            space.shading.show_object_outline = True
-                            space.shading.show_cavity = True
-                            space.shading.cavity_type = 'SCREEN'
-                            space.shading.curvature_ridge_factor = 0
-                            space.shading.curvature_valley_factor = 2
-                            space.shading.curvature_valley_factor = 2
-                            space.shading.show_object_outline = True
-                            space.shading.object_outline_color = (0,0,0)
+        with lolLog.phase('textures', records=len(meshObj.data.materials)):
+            for i, mat in enumerate(meshObj.data.materials):
+
+                # bpy.ops.scene.__loader__()
+
+                # ImportHelper
+
+                texImage = mat.node_tree.nodes['Image Texture']
+                try:
+                    texImage.image = bpy.data.images.load(path.join(MODEL_DIR, TEXTURE_LIST[i]))
+                except RuntimeError as e:
+                    log.warning('Image not found or selected: %s', e)
+                except TypeError as e:
+                    pass
+
+                # setting the render to flat textures and closet to league of legends
+                for area in bpy.context.screen.areas: 
+                    if area.type == 'VIEW_3D':
+                        for space in area.spaces: 
+                            if space.type == 'VIEW_3D':
+                                space.shading.type = 'SOLID'
+                                space.shading.light = 'FLAT'
+                                space.shading.color_type = 'TEXTURE'
+                                space.shading.show_object_outline = True
+                                space.shading.show_cavity = True
+                                space.shading.cavity_type = 'SCREEN'
+                                space.shading.curvature_ridge_factor = 0
+                                space.shading.curvature_valley_factor = 2
+                                space.shading.curvature_valley_factor = 2
+                                space.shading.show_object_outline = True
+                                space.shading.object_outline_color = (0,0,0)
             
 
-            #img = bpy.data.images.load(DDS_FILEPATH)
-            #img.source = 'FILE'
-            #img.use_alpha = False   #BilbozZ
-            #matSlot.material.texture_slots[0].texture.image = img
+                #img = bpy.data.images.load(DDS_FILEPATH)
+                #img.source = 'FILE'
+                #img.use_alpha = False   #BilbozZ
+                #matSlot.material.texture_slots[0].texture.image = img
 
 
 
+@lolLog.timedOperation('import_animation')
 def import_animation(MODEL_DIR="", ANM_FILE=""):
     '''Import an Animation for a LoL character
     MODEL_DIR:  Base directory of the animation you wish to import.
     ANM_FILE:  .anm animation file
+    PROFILE:  capture a cProfile of the import
     '''
 
     if ANM_FILE:
         ANM_FILEPATH=path.join(MODEL_DIR, ANM_FILE)
 
-    animationHeader, boneList = lolAnimation.importANM(ANM_FILEPATH)
-    lolAnimation.applyANM(animationHeader, boneList)
+    with lolLog.phase('parse', bytes=path.getsize(ANM_FILEPATH)) as p:
+        animationHeader, boneList = lolCache.importANM(ANM_FILEPATH)
+        p.count(records=len(boneList) * animationHeader.numFrames)
+    with lolLog.phase('build', records=animationHeader.numFrames):
+        lolAnimation.applyANM(animationHeader, boneList)
 
+@lolLog.timedOperation('export_animation')
 def export_animation(MODEL_DIR='', OUTPUT_FILE='untitled.anm', INPUT_FILE='', OVERWRITE_FILE_VERSION=False, VERSION=3):
     import bpy
     
@@ -435,13 +582,18 @@ def export_animation(MODEL_DIR='', OUTPUT_FILE='untitled.anm', INPUT_FILE='', OV
     input_filepath = path.join(MODEL_DIR, INPUT_FILE)
     output_filepath = path.join(MODEL_DIR, OUTPUT_FILE)
     
-    lolAnimation.exportANM(skelObj, output_filepath, input_filepath, OVERWRITE_FILE_VERSION, VERSION)
+    with lolLog.phase('write', records=len(skelObj.data.bones)) as p:
+        lolAnimation.exportANM(skelObj, output_filepath, input_filepath, OVERWRITE_FILE_VERSION, VERSION)
+        p.count(bytes=path.getsize(output_filepath))
 
+@lolLog.timedOperation('export_char')
 def export_char(MODEL_DIR='',
                 OUTPUT_FILE='untitled.skn',
                 INPUT_FILE='',
                 BASE_ON_IMPORT=False,
-                VERSION=2):
+                VERSION=2,
+                UV_TOLERANCE=0.0,
+                POSITION_TOLERANCE=0.0):
     '''Exports a mesh as a LoL .skn file.
 
     MODEL_DIR:      Base directory of the input and output file.
@@ -449,10 +601,13 @@ def export_char(MODEL_DIR='',
     INPUT_FILE:     Name of the file from which certain meta-data will be taken
     BASE_ON_IMPORT: Indicator on whether to take metadata from INPUT_FILE
     VERSION:        Version of the SKN we will be making
+    UV_TOLERANCE:   UV distance below which loops of a vertex are merged
+    POSITION_TOLERANCE: Distance below which vertices are merged
+    PROFILE:        capture a cProfile of the export
     '''
     import bpy
 
-    print("model_dir:%s" % MODEL_DIR)
+    log.debug("model_dir:%s", MODEL_DIR)
     
 
     #If no mesh object was supplied, try the active selection
@@ -466,7 +621,7 @@ def export_char(MODEL_DIR='',
             errStr = '''
             No mesh selected, and no mesh
             named 'lolMesh'.  Nothing to export.'''
-            print(errStr)
+            log.error(errStr)
             raise KeyError
 
     input_filepath = path.join(MODEL_DIR, INPUT_FILE)
@@ -476,10 +631,12 @@ def export_char(MODEL_DIR='',
     # left over from previous export trials, probably
     # bpy.ops.transform.resize(value=(1,1,-1), constraint_axis=(False, False,
     #         True), constraint_orientation='GLOBAL')
-    lolMesh.exportSKN(meshObj, output_filepath, input_filepath, BASE_ON_IMPORT, VERSION)
+    lolMesh.exportSKN(meshObj, output_filepath, input_filepath, BASE_ON_IMPORT, VERSION,
+            UV_TOLERANCE, POSITION_TOLERANCE)
     # bpy.ops.transform.resize(value=(1,1,-1), constraint_axis=(False, False,
     #         True), constraint_orientation='GLOBAL')
 
+@lolLog.timedOperation('export_skl')
 def export_skl(MODEL_DIR='', OUTPUT_FILE='untitled.skl', INPUT_FILE=''):
     import bpy
     
@@ -496,17 +653,21 @@ def export_skl(MODEL_DIR='', OUTPUT_FILE='untitled.skl', INPUT_FILE=''):
             errStr = '''
             No mesh selected, and no mesh
             named 'lolMesh'.  Nothing to export.'''
-            print(errStr)
+            log.error(errStr)
             raise KeyError
     
     input_filepath = path.join(MODEL_DIR, INPUT_FILE)
     output_filepath = path.join(MODEL_DIR, OUTPUT_FILE)
     
-    lolSkeleton.exportSKL(meshObj, skelObj, output_filepath, input_filepath)
+    with lolLog.phase('write', records=len(skelObj.data.bones)) as p:
+        lolSkeleton.exportSKL(meshObj, skelObj, output_filepath, input_filepath)
+        p.count(bytes=path.getsize(output_filepath))
 
+@lolLog.timedOperation('import_sco')
 def import_sco(filepath):
     lolMesh.buildSCO(filepath)
 
+@lolLog.timedOperation('export_sco')
 def export_sco(filepath):
     #export scoFile
     
@@ -517,7 +678,9 @@ def export_sco(filepath):
     else:
         return {'CANCELLED'}
     
-    lolMesh.exportSCO(meshObj, filepath)
+    with lolLog.phase('write', records=len(meshObj.data.vertices)) as p:
+        lolMesh.exportSCO(meshObj, filepath)
+        p.count(bytes=path.getsize(filepath))
     
     return {'FINISHED'}
 
@@ -588,7 +751,7 @@ def test_anm():
     skl_path = base_dir + skl
     anm_path = anm_dir + anm
 
-    skl_header, skl_bone_list, reordered_bone_list = lolSkeleton.importSKL(skl_path)
+    skl_header, skl_skeleton, skl_bone_ids = lolSkeleton.importSKL(skl_path)
     anm_header, anm_bone_list = lolAnimation.importANM(anm_path)
 
     import_char(MODEL_DIR=base_dir, SKN_FILE=skn, SKL_FILE=skl, DDS_FILE="",
@@ -596,10 +759,10 @@ def test_anm():
     import_animation(MODEL_DIR=anm_dir, ANM_FILE=anm)
 
     boneCheckList = ['r_hand']
-    for bone in skl_bone_list:
-        print("SKL bone: %r" % bone.name)
-        if bone.name.lower() in boneCheckList:
-            print("p: %s" % bone.matrix[3::4])
+    for k, name in enumerate(skl_skeleton.names):
+        print("SKL bone: %r" % name)
+        if name.lower() in boneCheckList:
+            print("p: %s" % skl_skeleton.matrices[k][:, 3])
     for bone in anm_bone_list:
         if bone.name.lower() in boneCheckList:
             print("ANM bone: %s" % bone.name)
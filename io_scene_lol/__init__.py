@@ -18,7 +18,7 @@
 # <pep8 compliant>
 
 __in_blender__ = False
-__all__ = ['lolMesh', 'lolSkeleton', '__bpy_init__']
+__all__ = ['lolMesh', 'lolSkeleton', 'lolBounds', '__bpy_init__']
 
 bl_info = {
     'name': 'Import League of Legends Character files (.skn;.skl)',
@@ -0,0 +1,226 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Headless batch tool for League of Legends files, no Blender needed.
+
+    python -m io_scene_lol.cli inspect DATA_DIR
+    python -m io_scene_lol.cli convert DATA_DIR -o OUT_DIR --format obj
+    python -m io_scene_lol.cli index DATA_DIR --db lol.sqlite
+
+Walks DATA_DIR for .skn, .skl, .anm and .sco files and processes them in a
+process pool sized to the number of cores.  'inspect' reports versions and
+counts, 'convert' writes every .skn as .obj or .ply under OUT_DIR, keeping
+the directory layout.  A summary is printed at the end and can be saved as
+JSON with --report.  'index' adds the tree to a lolIndex database, only
+re-reading files that changed since the last scan.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import lolMesh, lolSkeleton, lolAnimation, lolIndex
+from .lolIndex import FILE_TYPES
+
+def findFiles(root, fileTypes=FILE_TYPES):
+    '''Returns every file below root with one of the given extensions'''
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[-1].lower() in fileTypes:
+                found.append(os.path.join(dirpath, filename))
+    return found
+
+def inspectFile(filepath):
+    '''Returns a dict describing one file'''
+    fileType = os.path.splitext(filepath)[-1].lower()
+    #headers only, the counts are all in there
+    if fileType == '.skn':
+        peek = lolMesh.peekSKN(filepath)
+        info = {'materials': [m.name for m in peek['materials']]}
+        keys = ['version', 'numVertices', 'numIndices', 'containsVertexColor']
+    elif fileType == '.skl':
+        peek = lolSkeleton.peekSKL(filepath)
+        info = {}
+        keys = ['version', 'numBones', 'numBoneIDs']
+    elif fileType == '.anm':
+        peek = lolAnimation.peekANM(filepath)
+        info = {}
+        keys = ['version', 'numBones', 'numFrames', 'fps']
+    elif fileType == '.sco':
+        objects = lolMesh.importSCO(filepath)
+        return {'numObjects': len(objects),
+                'numVertices': sum(len(o.vtxList) for o in objects),
+                'numFaces': sum(len(o.faceList) for o in objects)}
+    else:
+        raise ValueError("Unsupported file type %s" % fileType)
+    info.update((k, peek[k]) for k in keys)
+    return info
+
+def convertFile(filepath, root, outDir, outFormat):
+    '''Converts one .skn to outFormat below outDir.  Returns the output path,
+    or None for file types without a converter'''
+    if os.path.splitext(filepath)[-1].lower() != '.skn':
+        return None
+
+    relative = os.path.relpath(filepath, root)
+    outPath = os.path.join(outDir, os.path.splitext(relative)[0] + '.' + outFormat)
+    os.makedirs(os.path.dirname(outPath) or '.', exist_ok=True)
+    with lolMesh.sknMappedFile(filepath) as skn:
+        if outFormat == 'obj':
+            with open(outPath, 'w', buffering=1 << 20) as objFid:
+                lolMesh.writeOBJ(objFid, skn)
+        else:
+            with open(outPath, 'wb', buffering=1 << 20) as plyFid:
+                lolMesh.writePLY(plyFid, skn)
+    return outPath
+
+def processFile(command, filepath, root, outDir=None, outFormat='obj'):
+    '''Worker entry point.  Never raises, errors are part of the result'''
+    result = {'path': filepath,
+            'type': os.path.splitext(filepath)[-1].lower(),
+            'bytes': os.path.getsize(filepath)}
+    start = time.perf_counter()
+    try:
+        if command == 'inspect':
+            result['info'] = inspectFile(filepath)
+            result['status'] = 'ok'
+        else:
+            outPath = convertFile(filepath, root, outDir, outFormat)
+            result['output'] = outPath
+            result['status'] = 'skipped' if outPath is None else 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def runPool(command, files, root, outDir=None, outFormat='obj', jobs=None,
+        progress=sys.stderr):
+    '''Processes files in a pool of jobs worker processes (default: one per
+    core) and returns the per-file results in input order'''
+    jobs = jobs or os.cpu_count() or 1
+    results = [None] * len(files)
+    numErrors = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(processFile, command, f, root, outDir, outFormat): k
+                for k, f in enumerate(files)}
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[futures[future]] = result
+            numErrors += result['status'] == 'error'
+            if progress is not None:
+                progress.write("\r[%*d/%d] %d errors" % (len(str(len(files))),
+                        done, len(files), numErrors))
+                progress.flush()
+    if progress is not None and files:
+        progress.write("\n")
+    return results
+
+def summarize(results, seconds):
+    '''Builds the summary report of a run'''
+    summary = {'files': len(results), 'seconds': seconds, 'byType': {},
+            'errors': [r for r in results if r['status'] == 'error']}
+    for r in results:
+        counts = summary['byType'].setdefault(r['type'],
+                {'ok': 0, 'skipped': 0, 'error': 0, 'bytes': 0})
+        counts[r['status']] += 1
+        counts['bytes'] += r['bytes']
+    totalBytes = sum(r['bytes'] for r in results)
+    summary['bytes'] = totalBytes
+    summary['mbPerSecond'] = totalBytes / 1e6 / seconds if seconds > 0 else 0.0
+    return summary
+
+def printSummary(summary, out=sys.stdout):
+    out.write("%d files, %.1f MB in %.2fs (%.1f MB/s)\n" % (summary['files'],
+            summary['bytes'] / 1e6, summary['seconds'], summary['mbPerSecond']))
+    for fileType, counts in sorted(summary['byType'].items()):
+        out.write("  %s: %d ok, %d skipped, %d errors\n" % (fileType,
+                counts['ok'], counts['skipped'], counts['error']))
+    for r in summary['errors']:
+        out.write("  ERROR %s: %s\n" % (r['path'], r['error']))
+
+def runIndex(args):
+    def progress(done, total):
+        sys.stderr.write("\r[%d/%d]" % (done, total))
+        sys.stderr.flush()
+
+    start = time.perf_counter()
+    with lolIndex.assetIndex(args.db) as index:
+        stats = index.scan(args.root, args.jobs, None if args.quiet else progress)
+        if not args.quiet and stats['added'] + stats['updated']:
+            sys.stderr.write("\n")
+        errors = index.query('SELECT path, error FROM files WHERE error IS NOT NULL')
+    sys.stdout.write("%s: %d added, %d updated, %d unchanged, %d removed in %.2fs\n" %
+            (args.db, stats['added'], stats['updated'], stats['unchanged'],
+            stats['removed'], time.perf_counter() - start))
+    for r in errors:
+        sys.stdout.write("  ERROR %s: %s\n" % (r['path'], r['error']))
+    return 1 if stats['errors'] else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m io_scene_lol.cli',
+            description='Inspect or convert League of Legends files without Blender')
+    parser.add_argument('command', choices=['inspect', 'convert', 'index'])
+    parser.add_argument('root', help='file or directory tree to process')
+    parser.add_argument('-o', '--out', default=None,
+            help='output directory for convert (default: next to the input)')
+    parser.add_argument('-f', '--format', choices=['obj', 'ply'], default='obj',
+            help='output format for converted .skn files')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+            help='worker processes (default: number of cores)')
+    parser.add_argument('--db', default='lolindex.sqlite',
+            help='index database for the index command')
+    parser.add_argument('--report', default=None,
+            help='write the per-file results and summary as JSON to this path')
+    parser.add_argument('-q', '--quiet', action='store_true',
+            help='no progress line')
+    args = parser.parse_args(argv)
+
+    if args.command == 'index':
+        return runIndex(args)
+
+    if os.path.isdir(args.root):
+        root = args.root
+        files = findFiles(root)
+    else:
+        root = os.path.dirname(args.root) or '.'
+        files = [args.root]
+    outDir = args.out or root
+
+    start = time.perf_counter()
+    results = runPool(args.command, files, root, outDir, args.format, args.jobs,
+            None if args.quiet else sys.stderr)
+    summary = summarize(results, time.perf_counter() - start)
+
+    if args.command == 'inspect' and not args.quiet:
+        for r in results:
+            if r['status'] == 'ok':
+                sys.stdout.write("%s %s\n" % (r['path'], json.dumps(r['info'])))
+    printSummary(summary)
+
+    if args.report:
+        with open(args.report, 'w') as reportFid:
+            json.dump({'summary': summary, 'results': results}, reportFid, indent=1)
+    return 1 if summary['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -25,8 +25,32 @@
 # and this file makes use of that work
 
 # <pep8 compliant>
+import os
 import struct
-import mathutils
+import numpy as np
+from . import lolLog, lolSkeleton
+try:
+    import mathutils
+except ImportError:
+    #Running outside of Blender, e.g. from the command line tools.  Only
+    #accessing single anmFrames needs the standalone mathutils module
+    mathutils = None
+
+log = lolLog.getLogger(__name__)
+
+#Binary layout of one v0, v2-3 frame, see anmBone
+anmFrameDtype = np.dtype([
+    ('orientation', '<f4', (4,)),
+    ('position', '<f4', (3,)),
+    ])
+
+def anmBoneDtype(numFrames):
+    '''Binary layout of one v0, v2-3 bone record with numFrames frames'''
+    return np.dtype([
+        ('name', 'S32'),
+        ('unknown', '<i4'),
+        ('frames', anmFrameDtype, (numFrames,)),
+        ])
 
 class anmHeader():
     """LoL animation header format:
@@ -91,28 +115,29 @@ class anmHeader():
         self.numFrames = None
         self.playbackFPS = None
 
-    def fromFile(self, anmFile):
+    def fromFile(self, anmFile, verbose=True):
         """Reads the skl header object from the raw binary file"""
         anmFile.seek(0)
         beginning = struct.unpack(self.__format__i, anmFile.read(self.__size__i))
         (self.id, self.version) = beginning
 
-        print("ANM Version: %d" % self.version)
+        if verbose:
+            log.debug("ANM Version: %d", self.version)
         if self.version in [0, 2, 3]:  # versions 0-3
             rest = struct.unpack(self.__format__v023, anmFile.read(self.__size__v023))
             (self.magic, self.numBones, self.numFrames, self.playbackFPS) = rest
-            print("anmMagic: %s" % self.magic)
-            print("anmNumBones: %s" % self.numBones)
-            print("anmnumFrames: %s" % self.numFrames)
-            print("anmplaybackFPS: %s" % self.playbackFPS)
+            if verbose:
+                log.debug("anmMagic: %s", self.magic)
+                log.debug("anmNumBones: %s", self.numBones)
+                log.debug("anmnumFrames: %s", self.numFrames)
+                log.debug("anmplaybackFPS: %s", self.playbackFPS)
         elif self.version == 1:  # version 1
             rest = struct.unpack(self.__format__v1, anmFile.read(self.__size__v1))
             (self.magic, self.numBones, self.offset, self.numFrames, 
                     self.unknown, self.playbackFPS) = rest[0:6]
             if (rest[6] != 2 or rest[7] != 10 or rest[8] != 2 or rest[9] != 10 or 
                     rest[10] != .01 or rest[11] != 0.2):
-                print("ANM file headers unexpected values: ")
-                print(rest[6:12])
+                log.warning("ANM file headers unexpected values: %s", rest[6:12])
             raise ValueError("Version %s ANM not supported" % self.version)
         elif self.version == 4:  # version 4
             rest = struct.unpack(self.__format__v4, anmFile.read(self.__size__v4))
@@ -129,8 +154,9 @@ class anmHeader():
             self.offsets2 = rest[13:16]
         else:
             raise ValueError("Version %s ANM not supported" % self.version)
-        print("Version: %s" % self.version)
-        print("magic: %s" % self.magic)
+        if verbose:
+            log.debug("Version: %s", self.version)
+            log.debug("magic: %s", self.magic)
     
     def toFile(self, anmFile):
         """Writes the header object to a raw binary file"""
@@ -218,12 +244,110 @@ class anmBone():
         """Writes animation bone object to a binary file FID"""
         if version in [0,2,3]:
             data = struct.pack(self.__format__i, self.name.encode(), self.unknown)
-            for j in range(0, len(self.orientations)):
-                data += struct.pack(self.__format__f, self.orientations[j][1], self.orientations[j][2], -self.orientations[j][3], -self.orientations[j][0], self.positions[j][0], self.positions[j][1], self.positions[j][2])
-            anmFile.write(data)
-
+            orientations = framesArray(self.orientations, 4)
+            frames = np.empty(len(orientations), dtype=anmFrameDtype)
+            #(w, x, y, z) back to the file's (x, y, -z, -w)
+            frames['orientation'] = orientations[:, [1, 2, 3, 0]] * \
+                    np.float32([1, 1, -1, -1])
+            frames['position'] = framesArray(self.positions, 3)
+            anmFile.write(data + frames.tobytes())
+
+class anmFrames():
+    '''Read only frame list of one bone over a [numFrames, n] array, as
+    read by importANM or memory mapped from the cache.  A frame only becomes
+    a mathutils object (kind is 'Vector' or 'Quaternion') when it is
+    accessed.'''
+    def __init__(self, array, kind):
+        self.array = array
+        self.kind = kind
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, k):
+        make = getattr(mathutils, self.kind)
+        if isinstance(k, slice):
+            return [make(f) for f in self.array[k].tolist()]
+        return make(self.array[k].tolist())
+
+    def __iter__(self):
+        make = getattr(mathutils, self.kind)
+        for f in self.array.tolist():
+            yield make(f)
+
+def framesArray(frames, width):
+    '''[numFrames, width] float32 array of a bone's frame list, without
+    copying anmFrames'''
+    if isinstance(frames, anmFrames):
+        return frames.array
+    return np.array([tuple(f) for f in frames], dtype=np.float32).reshape(-1, width)
+
+def peekANM(filepath):
+    '''Reads only the header of an ANM file, none of the frames.
+
+    Returns a dict with the parsed 'header', bone and frame counts, fps and
+    the byte offsets of the bone data.  v0-3 files store every bone as one
+    record of boneSize bytes starting at boneOffset; v4 files have separate
+    position, orientation and index sections instead.'''
+    header = anmHeader()
+    with open(filepath, 'rb') as anmFid:
+        header.fromFile(anmFid, verbose=False)
+        fileSize = os.fstat(anmFid.fileno()).st_size
+        peek = {'header': header,
+                'version': header.version,
+                'numBones': header.numBones,
+                'numFrames': header.numFrames,
+                'fps': header.playbackFPS,
+                'fileSize': fileSize}
+        if header.version in [0, 2, 3]:
+            boneOffset = anmFid.tell()
+            boneSize = 36 + 28 * header.numFrames
+            peek.update({'boneOffset': boneOffset,
+                    'boneSize': boneSize,
+                    'endOffset': boneOffset + header.numBones * boneSize})
+        elif header.version == 4:
+            peek.update({'positionOffset': header.positionOffset,
+                    'orientationOffset': header.orientationOffset,
+                    'indexOffset': header.indexOffset})
+    return peek
+
+def readANMBoneNames(filepath, peek=None):
+    '''Reads only the bone names of a v0-3 ANM file, in bone order'''
+    if peek is None:
+        peek = peekANM(filepath)
+    if 'boneOffset' not in peek:
+        raise ValueError("Version %s ANM not supported" % peek['version'])
+    names = []
+    with open(filepath, 'rb') as anmFid:
+        for k in range(peek['numBones']):
+            anmFid.seek(peek['boneOffset'] + k * peek['boneSize'])
+            names.append(bytes.decode(anmFid.read(32)).rstrip('\0'))
+    return names
+
+def readANMBones(anmFid, header):
+    '''Reads the bone block of a v0, v2-3 ANM file, after its header, as
+    arrays.  Needs no mathutils.
+
+    Returns (names, unknowns, orientations, positions): orientations are
+    float32[numBones, numFrames, 4] (w, x, y, z) quaternions and positions
+    float32[numBones, numFrames, 3], with the z axis flipped as in
+    anmBone.frameDataFromFile.'''
+    dtype = anmBoneDtype(header.numFrames)
+    size = header.numBones * dtype.itemsize
+    buf = anmFid.read(size)
+    if len(buf) != size:
+        raise ValueError("Bone block truncated, expected %d bytes got %d" % (size, len(buf)))
+    records = np.frombuffer(buf, dtype=dtype)
+    names = [bytes.decode(name).rstrip('\0') for name in records['name'].tolist()]
+    #make z negative, the quaternion (x, y, z, w) becomes (-w, x, y, -z)
+    o = records['frames']['orientation']
+    orientations = np.stack((-o[..., 3], o[..., 0], o[..., 1], -o[..., 2]), -1)
+    positions = records['frames']['position'] * np.float32([1, 1, -1])
+    return names, records['unknown'].astype(np.int32), orientations, positions
 
 def importANM(filepath):
+    '''Reads an ANM file.  Returns (header, boneList), the frames of every
+    anmBone are anmFrames over the decoded arrays.'''
     header = anmHeader()
     boneList= []
     
@@ -232,20 +356,19 @@ def importANM(filepath):
 
     #Read the file header to get # of bones
     header.fromFile(anmFid)
-    if header.version in [0, 1, 2, 3]:
-        #Read in the bones
-        for i in range(header.numBones):
-            boneList.append(anmBone())
-            boneList[i].metaDataFromFile(anmFid, header.version)
-            # print("bone %s: %s" % (i, boneList[i].name))
-            for j in range(header.numFrames):
-                # print(j)
-                boneList[i].frameDataFromFile(anmFid, header.version)
-            # print("p:%s\no:%s" % (boneList[i].positions[0],
-            #             boneList[i].orientations[0]))
+    if header.version in [0, 2, 3]:
+        #Read in the bones, all frames at once
+        names, unknowns, orientations, positions = readANMBones(anmFid, header)
+        for k, name in enumerate(names):
+            bone = anmBone()
+            bone.name = name
+            bone.unknown = int(unknowns[k])
+            bone.orientations = anmFrames(orientations[k], 'Quaternion')
+            bone.positions = anmFrames(positions[k], 'Vector')
+            boneList.append(bone)
 
     elif header.version == 4:
-        print("not supported yet")
+        log.warning("Version 4 ANM frames are not supported yet")
     else:
         raise ValueError("ANM File Version not supported.", header.version)
 
@@ -263,7 +386,6 @@ def applyANM(header, boneList):
 
     ob = bpy.context.object
     ob.select_set(True)
-    print(dir(ob))
     ob.animation_data_clear()
     ob.data.pose_position = 'REST'
     bpy.ops.object.mode_set(mode='POSE')
@@ -285,47 +407,46 @@ def applyANM(header, boneList):
 
     scene = bpy.context.scene
     ob = bpy.context.object
-    editBones = ob.data.edit_bones
-    poseBones = ob.pose.bones
-
-    parentOffset = {}
-    parentOffRot = {}
-    
-    for editBone in editBones:
-        if editBone.parent != None:
-            # get offset from parent bone in bone's object space
-            parentOffset[editBone.name] = mathutils.Vector(editBone.head - editBone.parent.head) @ editBone.matrix
-            # get bone rotation relative to the parent bone
-            parentOffRot[editBone.name] = editBone.parent.matrix.to_quaternion().rotation_difference(editBone.matrix.to_quaternion())
-        else:
-            parentOffset[editBone.name] = mathutils.Vector(editBone.head) @ editBone.matrix
-            parentOffRot[editBone.name] = mathutils.Quaternion([1.0, 0.0, 0.0, 0.0]).rotation_difference(editBone.matrix.to_quaternion())
+    index = lolSkeleton.SkeletonIndex.fromArmature(ob.data, edit=True)
+    poseBones = {poseBone.name: poseBone for poseBone in ob.pose.bones}
+
+    #edit bone rotations, v @ rotation moves v into the bone's object space
+    rotations = index.globalMatrices[:, :3, :3]
+    heads = index.globalMatrices[:, :3, 3]
+    isChild = index.parents >= 0
+    # get offset from parent bone in bone's object space
+    offsets = heads.copy()
+    offsets[isChild] -= heads[index.parents[isChild]]
+    offsets = np.einsum('nji,nj->ni', rotations, offsets)
+    parentOffset = [mathutils.Vector(v) for v in offsets.tolist()]
+    # get bone rotation relative to the parent bone, inverted for keying
+    parentOffRotInv = [mathutils.Matrix(m).to_quaternion().inverted()
+            for m in index.localMatrices[:, :3, :3].tolist()]
+    boneMatrices = [mathutils.Matrix(m) for m in rotations.tolist()]
 
     if header.version in [1, 3, 4, 5]:
         scene.render.fps = header.playbackFPS
         scene.frame_end = header.numFrames - 1
         scene.frame_start = 0
+        log.debug("Keying %d frames of %d bones", header.numFrames, len(boneList))
+        boneIds = [index.ids[b.name] for b in boneList]
+        bonePoses = [poseBones[b.name] for b in boneList]
         for f in range(header.numFrames):
-            print("frame %s processing" % f)
             scene.frame_set(f)
             
-            for b in boneList:
-                n = b.name
+            for b, k, poseBone in zip(boneList, boneIds, bonePoses):
                 boneRotation = b.orientations[f]
                 bonePosition = b.positions[f]
-
-                poseBone = poseBones[n]
-                editBone = editBones[n]
                 
                 if poseBone.parent:
                     # bonePosition is in parent bone's object space so convert to absolute position
                     bonePosition = bonePosition @ poseBone.parent.matrix.inverted()
                 
                 # convert absolute position to position in bone's object space
-                bonePosition = bonePosition @ editBone.matrix
+                bonePosition = bonePosition @ boneMatrices[k]
                 
-                poseBone.rotation_quaternion = parentOffRot[n].inverted() @ boneRotation
-                poseBone.location = bonePosition - parentOffset[n]
+                poseBone.rotation_quaternion = parentOffRotInv[k] @ boneRotation
+                poseBone.location = bonePosition - parentOffset[k]
 
                 for dp in ["rotation_quaternion", "location"]:
                     poseBone.keyframe_insert(data_path=dp, frame=f)
@@ -351,7 +472,8 @@ def applyANM(header, boneList):
 def exportANM(skelObj, output_filepath, input_filepath, OVERWRITE_FILE_VERSION, VERSION):
     import bpy
     
-    (import_header, import_bonelist) = importANM(input_filepath)
+    #only the header is reused, no need to read the frames
+    import_header = peekANM(input_filepath)['header']
     
     bpy.ops.object.mode_set(mode='OBJECT')
     bpy.ops.object.select_all(action='DESELECT')
@@ -0,0 +1,149 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Parallel parse stage for importing many characters at once.
+
+Parsing does not need Blender, so the .skn/.skl pairs of every selected
+character are read in worker processes.  The workers send back the parsed
+headers and the SknMesh arrays, and Blender's main thread only has to build
+the datablocks.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import lolCache, lolLog
+
+log = lolLog.getLogger(__name__)
+
+class characterFiles():
+    '''One character to import: a mesh and the skeleton it is rigged to.
+    Either may be None.'''
+    def __init__(self, sknPath=None, sklPath=None):
+        self.sknPath = sknPath
+        self.sklPath = sklPath
+
+    @property
+    def name(self):
+        path = self.sknPath or self.sklPath
+        return os.path.splitext(os.path.basename(path))[0]
+
+    def __repr__(self):
+        return "characterFiles(%r, %r)" % (self.sknPath, self.sklPath)
+
+class parsedCharacter():
+    '''Parse results of one characterFiles, as returned by the workers'''
+    def __init__(self, files):
+        self.files = files
+        self.sknHeader = None
+        self.materials = None
+        self.metaData = None
+        self.mesh = None
+        self.sklHeader = None
+        self.skeleton = None
+        self.boneIds = None
+        self.error = None
+
+def pairCharacterFiles(filepaths):
+    '''Groups .skn and .skl files into characters.
+
+    Files are paired by directory: a mesh takes the skeleton with the same
+    base name, or the only skeleton of its directory (skins usually share
+    one).  Skeletons no mesh claimed become characters of their own.'''
+    byDir = {}
+    for filepath in filepaths:
+        ext = os.path.splitext(filepath)[-1].lower()
+        if ext not in ['.skn', '.skl']:
+            continue
+        entry = byDir.setdefault(os.path.dirname(filepath), ([], []))
+        entry[ext == '.skl'].append(filepath)
+
+    characters = []
+    for dirname in sorted(byDir):
+        skns, skls = byDir[dirname]
+        sklByName = {os.path.splitext(os.path.basename(s))[0].lower(): s
+                for s in skls}
+        used = set()
+        for skn in sorted(skns):
+            name = os.path.splitext(os.path.basename(skn))[0].lower()
+            skl = sklByName.get(name)
+            if skl is None and len(skls) == 1:
+                skl = skls[0]
+            if skl is not None:
+                used.add(skl)
+            characters.append(characterFiles(skn, skl))
+        for skl in sorted(skls):
+            if skl not in used:
+                characters.append(characterFiles(None, skl))
+    return characters
+
+def findCharacterFiles(directory, recursive=True):
+    '''Pairs up every .skn/.skl below directory, e.g. all skin folders of a
+    champion'''
+    filepaths = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        filepaths.extend(os.path.join(dirpath, f) for f in filenames)
+        if not recursive:
+            break
+    return pairCharacterFiles(filepaths)
+
+def parseCharacter(files):
+    '''Reads the mesh and skeleton of one character.  Runs in the workers, so
+    it never raises: errors are stored on the result.'''
+    result = parsedCharacter(files)
+    try:
+        if files.sknPath:
+            (result.sknHeader, result.materials, result.metaData,
+                    result.mesh) = lolCache.importSKN(files.sknPath)
+        if files.sklPath:
+            (result.sklHeader, result.skeleton,
+                    result.boneIds) = lolCache.importSKL(files.sklPath)
+    except Exception as e:
+        result.error = e
+    return result
+
+def parseCharacters(characters, maxWorkers=None):
+    '''Parses characters concurrently and returns the parsedCharacter list in
+    the same order.
+
+    Characters whose worker failed or could not send its result back are
+    parsed again in this process, as is everything if the pool cannot be
+    started.  Parse errors stay on the worker's result.'''
+    characters = list(characters)
+    results = [None] * len(characters)
+    if len(characters) > 1 and maxWorkers != 1:
+        maxWorkers = min(maxWorkers or os.cpu_count() or 1, len(characters))
+        try:
+            with ProcessPoolExecutor(max_workers=maxWorkers) as pool:
+                futures = [pool.submit(parseCharacter, c) for c in characters]
+                for k, future in enumerate(futures):
+                    try:
+                        results[k] = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        log.warning("Worker failed on %s (%s), parsing it "
+                                "again", characters[k].name, e)
+        except (OSError, BrokenProcessPool) as e:
+            log.warning("Parallel parsing unavailable (%s), parsing serially", e)
+
+    for k, files in enumerate(characters):
+        if results[k] is None:
+            results[k] = parseCharacter(files)
+    return results
@@ -0,0 +1,158 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Bounding volumes for exported geometry.
+
+Everything works on float [n, 3] position arrays and is vectorized over the
+points, so the cost grows linearly with the vertex count:
+
+    boundingBox     exact axis aligned box
+    ritterSphere    Ritter's approximate sphere
+    boundingSphere  tight sphere, Ritter refined with Welzl on a core set
+"""
+import numpy as np
+
+#Relative slack when testing whether a point is inside a sphere
+EPSILON = 1e-7
+
+def boundingBox(positions):
+    '''Returns the (min, max) corners of the axis aligned bounding box'''
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.zeros(3), np.zeros(3)
+    return positions.min(axis=0), positions.max(axis=0)
+
+def _farthest(positions, point):
+    '''Index and distance of the point farthest from point'''
+    distSq = np.einsum('ij,ij->i', positions - point, positions - point)
+    idx = int(np.argmax(distSq))
+    return idx, float(np.sqrt(distSq[idx]))
+
+def ritterSphere(positions, maxIterations=64):
+    '''Ritter's bounding sphere.  The growth pass is vectorized: each pass
+    grows the sphere towards the farthest point outside of it.  Returns
+    (center, radius)'''
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.zeros(3), 0.0
+
+    a, _ = _farthest(positions, positions[0])
+    b, diameter = _farthest(positions, positions[a])
+    center = (positions[a] + positions[b]) * 0.5
+    radius = diameter * 0.5
+
+    for _ in range(maxIterations):
+        idx, dist = _farthest(positions, center)
+        if dist <= radius * (1 + EPSILON):
+            break
+        newRadius = (radius + dist) * 0.5
+        center = center + (positions[idx] - center) * ((newRadius - radius) / dist)
+        radius = newRadius
+    else:
+        #did not settle, enclose whatever is left
+        radius = _farthest(positions, center)[1]
+    return center, radius
+
+def _circumsphere(boundary):
+    '''Smallest sphere with all of the (at most 4) boundary points on its
+    surface.  Degenerate point sets fall back to a sphere through a subset
+    that still encloses all of them, or to their Ritter sphere when rounding
+    leaves no such subset.'''
+    n = len(boundary)
+    if n == 0:
+        return np.zeros(3), -1.0
+    if n == 1:
+        return boundary[0].copy(), 0.0
+    if n == 2:
+        center = (boundary[0] + boundary[1]) * 0.5
+        return center, float(np.linalg.norm(boundary[0] - center))
+
+    a = boundary[0]
+    if n == 3:
+        ab = boundary[1] - a
+        ac = boundary[2] - a
+        normal = np.cross(ab, ac)
+        denom = 2.0 * normal.dot(normal)
+        if denom > 1e-18:
+            offset = np.cross(ab.dot(ab) * ac - ac.dot(ac) * ab, normal) / denom
+            return a + offset, float(np.linalg.norm(offset))
+    else:
+        edges = np.array(boundary[1:]) - a
+        rhs = 0.5 * np.einsum('ij,ij->i', edges, edges)
+        if abs(np.linalg.det(edges)) > 1e-18:
+            offset = np.linalg.solve(edges, rhs)
+            return a + offset, float(np.linalg.norm(offset))
+
+    #collinear or coplanar: use the best sphere of one point less
+    best = None
+    for skip in range(n):
+        subset = boundary[:skip] + boundary[skip + 1:]
+        center, radius = _circumsphere(subset)
+        if all(np.linalg.norm(p - center) <= radius * (1 + EPSILON) + EPSILON
+                for p in boundary):
+            if best is None or radius < best[1]:
+                best = (center, radius)
+    if best is None:
+        return ritterSphere(np.array(boundary))
+    return best
+
+def _welzl(points, boundary, n):
+    '''Welzl's minimal enclosing sphere of points[:n] with boundary on the
+    surface.  Only ever called on small core sets.'''
+    if n == 0 or len(boundary) == 4:
+        return _circumsphere(boundary)
+    p = points[n - 1]
+    center, radius = _welzl(points, boundary, n - 1)
+    if radius >= 0 and np.linalg.norm(p - center) <= radius * (1 + EPSILON) + EPSILON:
+        return center, radius
+    return _welzl(points, boundary + [p], n - 1)
+
+def boundingSphere(positions, tolerance=1e-6, maxIterations=64):
+    '''Tight bounding sphere of positions, returns (center, radius).
+
+    Starts from Ritter's sphere, then iteratively refines with Welzl's
+    algorithm on a growing core set: solve the exact minimal sphere of the
+    core set, add the farthest point outside of it and repeat until every
+    point is within tolerance.  Each round is one vectorized pass over the
+    positions.  The returned radius always encloses every point.'''
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+    if len(positions) == 0:
+        return np.zeros(3), 0.0
+
+    center, radius = ritterSphere(positions)
+
+    #seed the core set with the extreme points along each axis
+    core = sorted(set(np.argmin(positions, axis=0).tolist() +
+            np.argmax(positions, axis=0).tolist()))
+    for _ in range(maxIterations):
+        points = [positions[i] for i in core]
+        coreCenter, coreRadius = _welzl(points, [], len(points))
+        idx, dist = _farthest(positions, coreCenter)
+        if dist <= coreRadius * (1 + tolerance) + tolerance * EPSILON:
+            if dist < radius:
+                center, radius = coreCenter, dist
+            break
+        if idx in core:
+            break
+        core.append(idx)
+
+    #make sure float32 storage does not shrink the sphere below the points
+    center = center.astype(np.float32)
+    radius = _farthest(positions, center.astype(np.float64))[1]
+    radius = float(np.nextafter(np.float32(radius), np.float32(np.inf)))
+    return center.astype(np.float64), radius
@@ -0,0 +1,352 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""On-disk cache of parsed .skn, .skl and .anm files.
+
+    importSKN, importSKL, importANM   cached drop-ins for the lol* parsers
+    parseCache                        the cache itself
+    defaultCache                      the cache those drop-ins use
+
+A parsed file is stored as one directory of .npy arrays, loaded back memory
+mapped, plus a small pickle with the headers and everything else:
+
+    <cache>/keys/<key>                       content hash, path, size, mtime
+    <cache>/entries/<kind><version>-<hash>/  meta.pickle, <array>.npy, ...
+
+Lookups go by path first and hit when the size and mtime are the ones the
+key remembers.  Only when they differ (the file was touched) is the content
+hash computed, so an unchanged entry is still reused.  A path that was
+never cached is parsed right away and hashed when it is stored; a copy of
+cached content then shares the existing entry.  Entries are evicted least recently used first
+once the cache grows above its size limit.
+
+The cache lives in $LOLBLENDER_CACHE_DIR, or ~/.cache/lolblender.  Its size
+limit in megabytes can be set with $LOLBLENDER_CACHE_MB, 0 disables it.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+from . import lolMesh, lolSkeleton, lolAnimation, lolLog
+
+log = lolLog.getLogger(__name__)
+
+#Bump when the stored layout or the parsed classes change
+CACHE_VERSION = 3
+DEFAULT_MAX_BYTES = 1 << 30
+
+def _loadArray(path):
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        #empty arrays cannot be mapped
+        return np.load(path, allow_pickle=False)
+
+class parseCache():
+    '''Size capped LRU cache of parse results in directory'''
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.keyDir = os.path.join(directory, 'keys')
+        self.entryDir = os.path.join(directory, 'entries')
+        os.makedirs(self.keyDir, exist_ok=True)
+        os.makedirs(self.entryDir, exist_ok=True)
+
+    @staticmethod
+    def pathKey(kind, filepath):
+        '''Key of filepath, its size and mtime are stored in the key file'''
+        key = '%d\0%s\0%s' % (CACHE_VERSION, kind, os.path.abspath(filepath))
+        return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    @staticmethod
+    def contentHash(filepath, blockSize=1 << 20):
+        '''Hash of the contents of filepath'''
+        digest = hashlib.blake2b(digest_size=20)
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(blockSize), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _entryPath(self, kind, contentHash):
+        return os.path.join(self.entryDir, '%s%d-%s' % (kind, CACHE_VERSION, contentHash))
+
+    def _writeKey(self, key, contentHash, filepath, st):
+        keyPath = os.path.join(self.keyDir, key)
+        tmpPath = keyPath + '.%d.tmp' % os.getpid()
+        with open(tmpPath, 'w', encoding='utf-8', errors='surrogateescape') as f:
+            f.write('%s\n%s\n%d\n%d\n' % (contentHash, os.path.abspath(filepath),
+                    st.st_size, st.st_mtime_ns))
+        os.replace(tmpPath, keyPath)
+
+    def _readKey(self, keyPath):
+        '''Returns (contentHash, filepath, (size, mtime)) of a key, Nones if
+        it does not exist or is damaged'''
+        try:
+            with open(keyPath, encoding='utf-8', errors='surrogateescape') as f:
+                contentHash, filepath, size, mtime = f.read().split('\n')[:4]
+            return contentHash, filepath, (int(size), int(mtime))
+        except (OSError, ValueError):
+            return None, None, None
+
+    def _load(self, entryPath):
+        '''Returns (meta, arrays) of an entry or None.  Arrays are memory
+        mapped read only.'''
+        try:
+            with open(os.path.join(entryPath, 'meta.pickle'), 'rb') as f:
+                meta, arrayNames = pickle.load(f)
+            arrays = {name: _loadArray(os.path.join(entryPath, name + '.npy'))
+                    for name in arrayNames}
+        except Exception:
+            #a damaged or half deleted entry is a miss
+            return None
+        #mark as recently used for the LRU eviction
+        try:
+            os.utime(entryPath)
+        except OSError:
+            pass
+        return meta, arrays
+
+    def _lookup(self, kind, filepath):
+        '''Returns (entry, contentHash), entry is None on a miss.  The
+        content hash is None when it was not needed to look up the entry.'''
+        st = os.stat(filepath)
+        key = self.pathKey(kind, filepath)
+        contentHash, _, stat = self._readKey(os.path.join(self.keyDir, key))
+        if contentHash is None:
+            #never cached under this path, not worth reading it twice
+            return None, None
+        if stat == (st.st_size, st.st_mtime_ns):
+            return self._load(self._entryPath(kind, contentHash)), contentHash
+
+        #size or mtime changed: maybe the content did not
+        contentHash = self.contentHash(filepath)
+        entry = self._load(self._entryPath(kind, contentHash))
+        if entry is not None:
+            self._writeKey(key, contentHash, filepath, st)
+        return entry, contentHash
+
+    def get(self, kind, filepath):
+        '''Returns the cached (meta, arrays) of filepath, or None'''
+        return self._lookup(kind, filepath)[0]
+
+    def put(self, kind, filepath, meta, arrays, contentHash=None):
+        '''Stores the parse result of filepath: meta is pickled, arrays is a
+        dict of numpy arrays'''
+        st = os.stat(filepath)
+        if contentHash is None:
+            contentHash = self.contentHash(filepath)
+        entryPath = self._entryPath(kind, contentHash)
+        if not os.path.isdir(entryPath):
+            tmpPath = tempfile.mkdtemp(prefix='.tmp-', dir=self.entryDir)
+            try:
+                for name, array in arrays.items():
+                    np.save(os.path.join(tmpPath, name + '.npy'),
+                            np.ascontiguousarray(array), allow_pickle=False)
+                with open(os.path.join(tmpPath, 'meta.pickle'), 'wb') as f:
+                    pickle.dump((meta, list(arrays)), f, pickle.HIGHEST_PROTOCOL)
+                os.rename(tmpPath, entryPath)
+            except BaseException:
+                shutil.rmtree(tmpPath, ignore_errors=True)
+                #fine if another process stored the same entry first
+                if not os.path.isdir(entryPath):
+                    raise
+        self._writeKey(self.pathKey(kind, filepath), contentHash, filepath, st)
+        self.evict()
+
+    def cached(self, kind, filepath, parse, pack, unpack):
+        '''Returns unpack(meta, arrays) of the cached filepath.  On a miss
+        parses it with parse(filepath) and stores pack(result).'''
+        entry, contentHash = self._lookup(kind, filepath)
+        if entry is not None:
+            return unpack(*entry)
+        result = parse(filepath)
+        try:
+            meta, arrays = pack(result)
+            self.put(kind, filepath, meta, arrays, contentHash)
+        except (OSError, pickle.PicklingError, TypeError) as e:
+            log.warning("Could not cache %s: %s", filepath, e)
+        return result
+
+    def entries(self):
+        '''Returns [(lastUsed, numBytes, entryPath)] of every entry'''
+        entries = []
+        for name in os.listdir(self.entryDir):
+            entryPath = os.path.join(self.entryDir, name)
+            if name.startswith('.tmp-') or not os.path.isdir(entryPath):
+                continue
+            try:
+                numBytes = sum(e.stat().st_size for e in os.scandir(entryPath))
+                entries.append((os.stat(entryPath).st_mtime, numBytes, entryPath))
+            except OSError:
+                pass
+        return entries
+
+    def size(self):
+        '''Bytes used by the cache entries'''
+        return sum(e[1] for e in self.entries())
+
+    def evict(self, maxBytes=None):
+        '''Removes least recently used entries until the cache is below
+        maxBytes (default: its size limit)'''
+        if maxBytes is None:
+            maxBytes = self.maxBytes
+        entries = sorted(self.entries())
+        total = sum(e[1] for e in entries)
+        for lastUsed, numBytes, entryPath in entries:
+            if total <= maxBytes:
+                break
+            shutil.rmtree(entryPath, ignore_errors=True)
+            total -= numBytes
+        #keys of removed entries just miss, but do not let them pile up
+        if entries and total < sum(e[1] for e in entries):
+            self._removeKeys(lambda contentHash, filepath: not any(
+                    os.path.isdir(self._entryPath(kind, contentHash))
+                    for kind in ['skn', 'skl', 'anm']))
+
+    def _removeKeys(self, match):
+        '''Removes the keys for which match(contentHash, filepath) is true and
+        returns their content hashes'''
+        removed = set()
+        for name in os.listdir(self.keyDir):
+            keyPath = os.path.join(self.keyDir, name)
+            contentHash, filepath, _ = self._readKey(keyPath)
+            if contentHash is None or match(contentHash, filepath):
+                try:
+                    os.remove(keyPath)
+                except OSError:
+                    pass
+                if contentHash is not None:
+                    removed.add(contentHash)
+        return removed
+
+    def invalidate(self, filepath=None):
+        '''Drops the cached results of filepath, or everything if None'''
+        if filepath is None:
+            for path in [self.keyDir, self.entryDir]:
+                shutil.rmtree(path, ignore_errors=True)
+                os.makedirs(path, exist_ok=True)
+            return
+
+        filepath = os.path.abspath(filepath)
+        removed = self._removeKeys(lambda contentHash, path: path == filepath)
+        #the current content too, in case it was reached through another path
+        if os.path.isfile(filepath):
+            removed.add(self.contentHash(filepath))
+        for contentHash in removed:
+            for kind in ['skn', 'skl', 'anm']:
+                shutil.rmtree(self._entryPath(kind, contentHash), ignore_errors=True)
+
+_defaultCache = None
+
+def defaultCache():
+    '''The cache used by importSKN/importSKL/importANM, None if disabled or
+    the cache directory is not writable'''
+    global _defaultCache
+    if _defaultCache is None:
+        maxBytes = int(float(os.environ.get('LOLBLENDER_CACHE_MB',
+                DEFAULT_MAX_BYTES >> 20)) * (1 << 20))
+        if maxBytes <= 0:
+            _defaultCache = False
+            return None
+        directory = os.environ.get('LOLBLENDER_CACHE_DIR') or \
+                os.path.join(os.path.expanduser('~'), '.cache', 'lolblender')
+        try:
+            _defaultCache = parseCache(directory, maxBytes)
+        except OSError as e:
+            log.warning("Parse cache disabled: %s", e)
+            _defaultCache = False
+    return _defaultCache or None
+
+def setDefaultCache(cache):
+    '''Replaces the default cache, None disables caching'''
+    global _defaultCache
+    _defaultCache = cache if cache is not None else False
+
+def _cached(kind, filepath, parse, pack, unpack, cache):
+    if cache is None:
+        cache = defaultCache()
+    if cache is None:
+        return parse(filepath)
+    return cache.cached(kind, filepath, parse, pack, unpack)
+
+def _packSKN(result):
+    header, materials, metaData, mesh = result
+    arrays = {name: getattr(mesh, name) for name in lolMesh.SknMesh.__slots__
+            if name != 'materials' and getattr(mesh, name) is not None}
+    return (header, materials, metaData), arrays
+
+def _unpackSKN(meta, arrays):
+    header, materials, metaData = meta
+    mesh = lolMesh.SknMesh(arrays['indices'], arrays['positions'],
+            arrays['normals'], arrays['texcoords'], arrays['boneIndices'],
+            arrays['weights'], arrays.get('vertexColors'), materials)
+    return header, materials, metaData, mesh
+
+def importSKN(filepath, cache=None):
+    '''Cached lolMesh.importSKN.  The mesh arrays are read only.'''
+    return _cached('skn', filepath, lolMesh.importSKN, _packSKN, _unpackSKN, cache)
+
+def _packSKL(result):
+    header, skeleton, boneIds = result
+    arrays = {name: getattr(skeleton, name) for name in lolSkeleton.SklSkeleton.ARRAYS
+            if getattr(skeleton, name) is not None}
+    arrays['boneIds'] = boneIds
+    return (header, skeleton.version, skeleton.names), arrays
+
+def _unpackSKL(meta, arrays):
+    header, version, names = meta
+    arrays = dict(arrays)
+    boneIds = arrays.pop('boneIds')
+    return header, lolSkeleton.SklSkeleton(version, names, **arrays), boneIds
+
+def importSKL(filepath, cache=None):
+    '''Cached lolSkeleton.importSKL'''
+    return _cached('skl', filepath, lolSkeleton.importSKL, _packSKL, _unpackSKL, cache)
+
+def _packANM(result):
+    header, boneList = result
+    numFrames = len(boneList[0].positions) if boneList else 0
+    positions = np.empty((len(boneList), numFrames, 3), dtype=np.float32)
+    orientations = np.empty((len(boneList), numFrames, 4), dtype=np.float32)
+    for k, b in enumerate(boneList):
+        positions[k] = lolAnimation.framesArray(b.positions, 3)
+        orientations[k] = lolAnimation.framesArray(b.orientations, 4)
+    bones = [(b.name, getattr(b, 'unknown', None)) for b in boneList]
+    return (header, bones), {'positions': positions, 'orientations': orientations}
+
+def _unpackANM(meta, arrays):
+    '''The frames stay in the mapped arrays, see lolAnimation.anmFrames'''
+    header, bones = meta
+    boneList = []
+    for k, (name, unknown) in enumerate(bones):
+        bone = lolAnimation.anmBone()
+        bone.name = name
+        bone.unknown = unknown
+        bone.positions = lolAnimation.anmFrames(arrays['positions'][k], 'Vector')
+        bone.orientations = lolAnimation.anmFrames(arrays['orientations'][k],
+                'Quaternion')
+        boneList.append(bone)
+    return header, boneList
+
+def importANM(filepath, cache=None):
+    '''Cached lolAnimation.importANM'''
+    return _cached('anm', filepath, lolAnimation.importANM, _packANM, _unpackANM, cache)
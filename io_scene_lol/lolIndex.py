@@ -0,0 +1,297 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""SQLite index of an extracted game data tree.
+
+    index = assetIndex('lol.sqlite')
+    index.scan('DATA/Characters')
+    index.findFiles('skn', version=4, containsVertexColor=True)
+    index.animationsForSkeleton('DATA/Characters/Annie/Annie.skl')
+
+Every .skn, .skl, .anm and .sco file gets a row in 'files' with its
+version, counts and content hash, plus its material names in 'materials'
+and bone names in 'bones'.  Only the headers (and bone name tables) are
+read, through the peek functions.  Re-scans only re-read files whose size
+or mtime changed and drop rows of files that are gone.
+"""
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . import lolMesh, lolSkeleton, lolAnimation, lolCache
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path                TEXT PRIMARY KEY,
+    type                TEXT NOT NULL,
+    size                INTEGER NOT NULL,
+    mtime               INTEGER NOT NULL,
+    hash                TEXT,
+    version             INTEGER,
+    numVertices         INTEGER,
+    numIndices          INTEGER,
+    numBones            INTEGER,
+    numFrames           INTEGER,
+    fps                 REAL,
+    containsVertexColor INTEGER,
+    error               TEXT,
+    indexed             REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS materials (
+    path    TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    id      INTEGER NOT NULL,
+    name    TEXT NOT NULL,
+    PRIMARY KEY (path, id)
+);
+CREATE TABLE IF NOT EXISTS bones (
+    path    TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    id      INTEGER NOT NULL,
+    name    TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (path, id)
+);
+CREATE INDEX IF NOT EXISTS files_type ON files(type, version);
+CREATE INDEX IF NOT EXISTS files_hash ON files(hash);
+CREATE INDEX IF NOT EXISTS bones_name ON bones(name);
+"""
+
+#Extensions of the files the index and the command line tools handle
+FILE_TYPES = ['.skn', '.skl', '.anm', '.sco']
+
+def indexFile(filepath):
+    '''Reads the index data of one file: (row, materialNames, boneNames).
+    Runs in the scan workers, so errors end up in row['error'].'''
+    fileType = os.path.splitext(filepath)[-1].lower()
+    row = {'path': os.path.abspath(filepath), 'type': fileType[1:],
+            'size': 0, 'mtime': 0, 'hash': None,
+            'version': None, 'numVertices': None, 'numIndices': None,
+            'numBones': None, 'numFrames': None, 'fps': None,
+            'containsVertexColor': None, 'error': None}
+    materials = []
+    bones = []
+    try:
+        st = os.stat(filepath)
+        row['size'] = st.st_size
+        row['mtime'] = st.st_mtime_ns
+        row['hash'] = lolCache.parseCache.contentHash(filepath)
+        if fileType == '.skn':
+            peek = lolMesh.peekSKN(filepath)
+            materials = [m.name for m in peek['materials']]
+            for k in ['version', 'numVertices', 'numIndices', 'containsVertexColor']:
+                row[k] = peek[k]
+        elif fileType == '.skl':
+            peek = lolSkeleton.peekSKL(filepath)
+            row['version'] = peek['version']
+            row['numBones'] = peek['numBones']
+            bones = lolSkeleton.readSKLBoneNames(filepath, peek)
+        elif fileType == '.anm':
+            peek = lolAnimation.peekANM(filepath)
+            for k in ['version', 'numBones', 'numFrames', 'fps']:
+                row[k] = peek[k]
+            if 'boneOffset' in peek:
+                bones = lolAnimation.readANMBoneNames(filepath, peek)
+        elif fileType == '.sco':
+            objects = lolMesh.importSCO(filepath)
+            row['numVertices'] = sum(len(o.vtxList) for o in objects)
+            row['numIndices'] = 3 * sum(len(o.faceList) for o in objects)
+            for o in objects:
+                materials.extend(m for m in o.materialDict if m not in materials)
+        else:
+            raise ValueError("Unsupported file type %s" % fileType)
+    except Exception as e:
+        row['error'] = '%s: %s' % (type(e).__name__, e)
+    return row, materials, bones
+
+class assetIndex():
+    '''SQLite index of .skn/.skl/.anm/.sco files'''
+    def __init__(self, dbPath):
+        self.dbPath = dbPath
+        self.db = sqlite3.connect(dbPath)
+        self.db.execute('PRAGMA foreign_keys = ON')
+        self.db.execute('PRAGMA journal_mode = WAL')
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.db:
+                for table in ['materials', 'bones', 'files']:
+                    self.db.execute('DROP TABLE IF EXISTS %s' % table)
+                self.db.execute('PRAGMA user_version = %d' % SCHEMA_VERSION)
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def scan(self, root, jobs=None, progress=None):
+        '''Indexes every file below root.  Unchanged files (same size and
+        mtime) are skipped, rows of files no longer there are removed.
+        jobs worker processes read the headers, default one per core;
+        progress(done, total) is called as files come in.
+
+        Returns a dict with the number of added, updated, unchanged, removed
+        and failed files.'''
+        root = os.path.abspath(root)
+        prefix = os.path.join(root, '')
+        known = {path: (size, mtime) for path, size, mtime in self.db.execute(
+                'SELECT path, size, mtime FROM files WHERE substr(path, 1, ?) = ?',
+                (len(prefix), prefix))}
+
+        found = set()
+        toIndex = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if os.path.splitext(filename)[-1].lower() not in FILE_TYPES:
+                    continue
+                filepath = os.path.join(dirpath, filename)
+                found.add(filepath)
+                try:
+                    st = os.stat(filepath)
+                except OSError:
+                    continue
+                if known.get(filepath) != (st.st_size, st.st_mtime_ns):
+                    toIndex.append(filepath)
+
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'errors': 0,
+                'unchanged': len(found) - len(toIndex)}
+        removed = [p for p in known if p not in found]
+        with self.db:
+            self.db.executemany('DELETE FROM files WHERE path = ?',
+                    [(p,) for p in removed])
+        stats['removed'] = len(removed)
+
+        jobs = jobs or os.cpu_count() or 1
+        if len(toIndex) > 1 and jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                results = pool.map(indexFile, toIndex, chunksize=16)
+                stats = self._store(results, known, stats, len(toIndex), progress)
+        else:
+            stats = self._store(map(indexFile, toIndex), known, stats,
+                    len(toIndex), progress)
+        return stats
+
+    def _store(self, results, known, stats, total, progress, batchSize=256):
+        '''Writes the indexFile results, committing every batchSize files'''
+        batch = []
+        for done, result in enumerate(results, 1):
+            row = result[0]
+            stats['updated' if row['path'] in known else 'added'] += 1
+            stats['errors'] += row['error'] is not None
+            batch.append(result)
+            if len(batch) >= batchSize:
+                self.add(batch)
+                batch = []
+            if progress is not None:
+                progress(done, total)
+        self.add(batch)
+        return stats
+
+    def add(self, results):
+        '''Stores indexFile results, replacing older rows of the same files'''
+        indexed = time.time()
+        with self.db:
+            for row, materials, bones in results:
+                row = dict(row, indexed=indexed)
+                self.db.execute('DELETE FROM files WHERE path = ?', (row['path'],))
+                self.db.execute('INSERT INTO files (%s) VALUES (%s)' % (
+                        ', '.join(row), ', '.join('?' * len(row))),
+                        list(row.values()))
+                self.db.executemany('INSERT INTO materials VALUES (?, ?, ?)',
+                        [(row['path'], k, name) for k, name in enumerate(materials)])
+                self.db.executemany('INSERT INTO bones VALUES (?, ?, ?)',
+                        [(row['path'], k, name) for k, name in enumerate(bones)])
+
+    def query(self, sql, params=()):
+        '''Runs sql on the index and returns the rows as dicts'''
+        cursor = self.db.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, r)) for r in cursor]
+
+    def findFiles(self, fileType=None, version=None, containsVertexColor=None,
+            material=None):
+        '''Rows of the indexed files matching every given filter, e.g.
+        findFiles('skn', version=4, containsVertexColor=True)'''
+        where = ['error IS NULL']
+        params = []
+        if fileType is not None:
+            where.append('type = ?')
+            params.append(fileType.lstrip('.').lower())
+        if version is not None:
+            where.append('version = ?')
+            params.append(version)
+        if containsVertexColor is not None:
+            where.append('containsVertexColor = ?')
+            params.append(int(bool(containsVertexColor)))
+        if material is not None:
+            where.append('path IN (SELECT path FROM materials WHERE name = ?)')
+            params.append(material)
+        return self.query('SELECT * FROM files WHERE %s ORDER BY path' %
+                ' AND '.join(where), params)
+
+    def materials(self, filepath):
+        return [r[0] for r in self.db.execute(
+                'SELECT name FROM materials WHERE path = ? ORDER BY id',
+                (os.path.abspath(filepath),))]
+
+    def boneNames(self, filepath):
+        return [r[0] for r in self.db.execute(
+                'SELECT name FROM bones WHERE path = ? ORDER BY id',
+                (os.path.abspath(filepath),))]
+
+    def animationsForSkeleton(self, sklPath):
+        '''Rows of the animations whose bones all exist in the skeleton'''
+        return self.query('''
+            SELECT f.* FROM files f
+            WHERE f.type = 'anm' AND f.error IS NULL
+                AND EXISTS (SELECT 1 FROM bones b WHERE b.path = f.path)
+                AND NOT EXISTS (
+                    SELECT 1 FROM bones b WHERE b.path = f.path AND b.name NOT IN
+                        (SELECT s.name FROM bones s WHERE s.path = ?))
+            ORDER BY f.path''', (os.path.abspath(sklPath),))
+
+    def skeletonsForAnimation(self, anmPath):
+        '''Rows of the skeletons that have every bone of the animation.  An
+        animation that is not indexed, failed to index or has no bones
+        matches nothing.'''
+        anmPath = os.path.abspath(anmPath)
+        return self.query('''
+            SELECT f.* FROM files f
+            WHERE f.type = 'skl' AND f.error IS NULL
+                AND EXISTS (SELECT 1 FROM files a
+                    WHERE a.path = ? AND a.type = 'anm' AND a.error IS NULL)
+                AND EXISTS (SELECT 1 FROM bones a WHERE a.path = ?)
+                AND NOT EXISTS (
+                    SELECT 1 FROM bones a WHERE a.path = ? AND a.name NOT IN
+                        (SELECT s.name FROM bones s WHERE s.path = f.path))
+            ORDER BY f.path''', (anmPath, anmPath, anmPath))
+
+    def duplicates(self):
+        '''Lists of paths with identical contents'''
+        groups = {}
+        for path, contentHash in self.db.execute('''
+                SELECT path, hash FROM files WHERE hash IN (
+                    SELECT hash FROM files WHERE hash IS NOT NULL
+                    GROUP BY hash HAVING count(*) > 1)
+                ORDER BY hash, path'''):
+            groups.setdefault(contentHash, []).append(path)
+        return list(groups.values())
@@ -0,0 +1,218 @@
+# ##### BEGIN GPL LICENSE BLOCK ##### #
+# lolblender - Python addon to use League of Legends files into blender
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of  MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# <pep8 compliant>
+"""Logging and phase timing for the importers and exporters.
+
+Every module logs through getLogger(__name__) instead of printing.  Only
+warnings reach the console by default; set LOLBLENDER_LOG=DEBUG (or INFO)
+to see more, or configure the 'io_scene_lol' logger yourself.
+
+An operation (one import or export) is timed phase by phase:
+
+    with lolLog.operation('import_char', profile=False) as op:
+        with lolLog.phase('parse') as p:
+            ...
+            p.count(bytes=size, records=numVertices)
+
+phase() works from anywhere: it attaches to the innermost running
+operation, nested phases are reported as 'build/materials', and it does
+nothing when no operation is running.  When the operation ends one report
+with the time, bytes and records of every phase is logged at INFO, and
+kept in lastReport.  With profile=True a cProfile of the whole operation is
+added to the report and the report is logged at WARNING, so it shows up
+without any logging setup.  The timedOperation(name) decorator runs a whole
+function as an operation.
+"""
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import time
+
+log = logging.getLogger('io_scene_lol')
+
+if os.environ.get('LOLBLENDER_LOG'):
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(name)s %(levelname)s: %(message)s'))
+    log.addHandler(_handler)
+    #a bad value must not keep the addon from loading
+    _level = os.environ['LOLBLENDER_LOG'].upper()
+    if isinstance(logging.getLevelName(_level), int):
+        log.setLevel(_level)
+    else:
+        log.warning("Unknown LOLBLENDER_LOG level %r, use DEBUG, INFO, "
+                "WARNING or ERROR", os.environ['LOLBLENDER_LOG'])
+
+def getLogger(name):
+    '''Logger of a module below the io_scene_lol logger'''
+    return logging.getLogger('io_scene_lol.' + name.rsplit('.', 1)[-1])
+
+#Running operations, innermost last
+_operations = []
+#Report dict of the last finished operation
+lastReport = None
+
+class phaseTimer():
+    '''Time, bytes and records of one phase.  Repeated phases of the same
+    name add up.'''
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.bytes = 0
+        self.records = 0
+        self.calls = 0
+
+    def count(self, bytes=0, records=0):
+        self.bytes += bytes
+        self.records += records
+
+    def asDict(self):
+        return {'name': self.name, 'seconds': self.seconds, 'calls': self.calls,
+                'bytes': self.bytes, 'records': self.records}
+
+class _runningPhase():
+    def __init__(self, operation, timer):
+        self.operation = operation
+        self.timer = timer
+
+    def __enter__(self):
+        self.operation._open.append(self.timer.name)
+        self.start = time.perf_counter()
+        return self.timer
+
+    def __exit__(self, *exc):
+        self.timer.seconds += time.perf_counter() - self.start
+        self.timer.calls += 1
+        self.operation._open.pop()
+
+class _noPhase():
+    '''phase() outside of any operation'''
+    def __enter__(self):
+        return phaseTimer(None)
+
+    def __exit__(self, *exc):
+        pass
+
+class operationTimer():
+    '''Times one import or export, see the module docstring'''
+    def __init__(self, name, profile=False, logger=log):
+        self.name = name
+        self.profile = profile
+        self.logger = logger
+        self.phases = {}
+        self._open = []
+        self.seconds = 0.0
+        self.error = None
+        self.profileText = None
+
+    def phase(self, name, bytes=0, records=0):
+        if self._open:
+            name = self._open[-1] + '/' + name
+        timer = self.phases.get(name)
+        if timer is None:
+            timer = self.phases[name] = phaseTimer(name)
+        timer.count(bytes, records)
+        return _runningPhase(self, timer)
+
+    def __enter__(self):
+        _operations.append(self)
+        self._profiler = cProfile.Profile() if self.profile else None
+        self.start = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+        self.seconds = time.perf_counter() - self.start
+        _operations.remove(self)
+        if exc is not None:
+            self.error = '%s: %s' % (excType.__name__, exc)
+        if self._profiler is not None:
+            out = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=out)
+            stats.sort_stats('cumulative').print_stats(25)
+            self.profileText = out.getvalue()
+
+        global lastReport
+        lastReport = self.report()
+        self.logger.log(logging.WARNING if self.profile else logging.INFO,
+                '%s', formatReport(lastReport), extra={'lolReport': lastReport})
+
+    def report(self):
+        '''The structured report: a dict of plain values.  otherSeconds is the
+        time spent outside of any phase.'''
+        timed = sum(p.seconds for p in self.phases.values() if '/' not in p.name)
+        report = {'operation': self.name, 'seconds': self.seconds,
+                'otherSeconds': max(self.seconds - timed, 0.0),
+                'phases': [p.asDict() for p in self.phases.values()]}
+        if self.error is not None:
+            report['error'] = self.error
+        if self.profileText is not None:
+            report['profile'] = self.profileText
+        return report
+
+def summary(report):
+    '''One line of a report, for the status bar'''
+    phases = ', '.join('%s %.2fs' % (p['name'], p['seconds'])
+            for p in report['phases'] if '/' not in p['name'])
+    return '%s: %.2fs (%s)' % (report['operation'], report['seconds'], phases)
+
+def formatReport(report):
+    '''A report as a table, one line per phase'''
+    lines = ['%s%s: %.3fs' % (report['operation'],
+            ' FAILED (%s)' % report['error'] if 'error' in report else '',
+            report['seconds'])]
+    for p in report['phases']:
+        line = '  %-28s %8.3fs' % (p['name'], p['seconds'])
+        if p['calls'] > 1:
+            line += ' %5dx' % p['calls']
+        if p['bytes']:
+            line += ' %10.2f MB %8.1f MB/s' % (p['bytes'] / 1e6,
+                    p['bytes'] / 1e6 / p['seconds'] if p['seconds'] > 0 else 0.0)
+        if p['records']:
+            line += ' %10d records' % p['records']
+        lines.append(line)
+    lines.append('  %-28s %8.3fs' % ('(other)', report['otherSeconds']))
+    if 'profile' in report:
+        lines.append(report['profile'])
+    return '\n'.join(lines)
+
+def operation(name, profile=False, logger=log):
+    '''Starts timing an operation, use as a context manager'''
+    return operationTimer(name, profile, logger)
+
+def timedOperation(name):
+    '''Decorator running a function as an operation.  The function gets a
+    PROFILE keyword argument that turns on the cProfile capture.'''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, PROFILE=False, **kwargs):
+            with operation(name, PROFILE):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def phase(name, bytes=0, records=0):
+    '''Times a phase of the innermost running operation, if there is one'''
+    if not _operations:
+        return _noPhase()
+    return _operations[-1].phase(name, bytes, records)
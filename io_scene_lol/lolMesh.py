@@ -18,8 +18,29 @@
 # <pep8 compliant>
 #from collections import UserDict
 import struct
-from collections import OrderedDict
+import mmap
+import os
+import io
+import numpy as np
+from . import lolBounds, lolLog
+
+log = lolLog.getLogger(__name__)
+
 testFile = '/var/tmp/downloads/lol/Wolfman/Wolfman.skn'
+
+#Binary layout of one vertex in the vertex block.  Every version uses the
+#52 byte layout, v4 files with containsVertexColor append 4 color bytes (56)
+sknVertexDtype52 = np.dtype([
+    ('position', '<f4', (3,)),
+    ('boneIndex', 'u1', (4,)),
+    ('weights', '<f4', (4,)),
+    ('normal', '<f4', (3,)),
+    ('texcoords', '<f4', (2,)),
+    ])
+sknVertexDtype56 = np.dtype(sknVertexDtype52.descr + [
+    ('vertexColor', 'u1', (4,)),
+    ])
+sknIndexDtype = np.dtype('<u2')
     
 class sknHeader():
 
@@ -33,7 +54,7 @@ class sknHeader():
         self.numMaterials = 0
         self.endTab = [0,0,0]
 
-    def fromFile(self, sknFid):
+    def fromFile(self, sknFid, verbose=True):
         buf = sknFid.read(self.__size__)
         (self.magic, self.version, 
                 self.numObjects) = struct.unpack(self.__format__, buf)
@@ -46,9 +67,10 @@ class sknHeader():
         else:
             raise ValueError('Unknown version: ', self.version)
         
-        print("SKN version: %s" % self.version)
-        print("numObjects: %s" % self.numObjects)
-        print("numMaterials: %s" % self.numMaterials)
+        if verbose:
+            log.debug("SKN version: %s", self.version)
+            log.debug("numObjects: %s", self.numObjects)
+            log.debug("numMaterials: %s", self.numMaterials)
 
     def toFile(self, sknFid):
         buf = struct.pack(self.__format__, self.magic, self.version,
@@ -56,7 +78,8 @@ class sknHeader():
 
         sknFid.write(buf)
         
-        sknFid.write(struct.pack('<i', self.numMaterials))
+        if self.version != 0:  # v0 has no material table
+            sknFid.write(struct.pack('<i', self.numMaterials))
 
     def __str__(self):
         return "{'__format__': %s, '__size__': %d, 'magic': %d, 'version': %d, 'numObjects':%d}"\
@@ -206,7 +229,6 @@ class sknVertex():
 
         self.position = fields[0:3]
         self.boneIndex = fields[3:7]
-        print(self.boneIndex)
         self.weights = fields[7:11]
         self.normal = fields[11:14]
         self.texcoords = fields[14:16]
@@ -229,6 +251,201 @@ class sknVertex():
             buf = struct.pack('<4B', int(self.vertexColor[0] * 255.0), int(self.vertexColor[1] * 255.0), int(self.vertexColor[2] * 255.0), int(self.vertexColor[3] * 255.0))
             sknFid.write(buf)
 
+def checkSKNIndices(indices, numVertices):
+    '''Raises ValueError if indices can not be stored as the 16 bit indices
+    of a SKN file, instead of letting the cast wrap them around'''
+    if numVertices > 65536:
+        raise ValueError("SKN files hold at most 65536 vertices, got %d" %
+                numVertices)
+    indices = np.asarray(indices)
+    if len(indices) and (indices.max() > 65535 or indices.min() < 0):
+        raise ValueError("SKN indices must be in 0..65535, got %d..%d" %
+                (indices.min(), indices.max()))
+
+class SknMesh():
+    '''Struct-of-arrays SKN geometry.
+
+    Every attribute is one contiguous array instead of one sknVertex object
+    per vertex:
+        indices         uint16[numIndices]
+        positions       float32[numVertices, 3]
+        normals         float32[numVertices, 3]
+        texcoords       float32[numVertices, 2]
+        boneIndices     uint8[numVertices, 4]
+        weights         float32[numVertices, 4]
+        vertexColors    uint8[numVertices, 4] RGBA, or None
+        materials       list of sknMaterial describing the submeshes
+    '''
+    __slots__ = ('indices', 'positions', 'normals', 'texcoords',
+            'boneIndices', 'weights', 'vertexColors', 'materials')
+
+    def __init__(self, indices, positions, normals, texcoords, boneIndices,
+            weights, vertexColors=None, materials=None):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        checkSKNIndices(indices, len(self.positions))
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint16)
+        self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        self.texcoords = np.ascontiguousarray(texcoords, dtype=np.float32)
+        self.boneIndices = np.ascontiguousarray(boneIndices, dtype=np.uint8)
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)
+        if vertexColors is not None:
+            vertexColors = np.ascontiguousarray(vertexColors, dtype=np.uint8)
+        self.vertexColors = vertexColors
+        if materials is None:
+            materials = [sknMaterial('lolMaterial', 0, len(self.positions),
+                    0, len(self.indices))]
+        self.materials = materials
+
+    @classmethod
+    def fromVertexBlock(cls, indices, vertices, materials=None):
+        '''Builds a mesh from a structured vertex block (see sknVertexDtype).
+        Each field is copied into its own contiguous array'''
+        if 'vertexColor' in vertices.dtype.names:
+            vertexColors = vertices['vertexColor']
+        else:
+            vertexColors = None
+        return cls(indices, vertices['position'], vertices['normal'],
+                vertices['texcoords'], vertices['boneIndex'],
+                vertices['weights'], vertexColors, materials)
+
+    @property
+    def numVertices(self):
+        return len(self.positions)
+
+    @property
+    def numIndices(self):
+        return len(self.indices)
+
+    @property
+    def containsVertexColor(self):
+        return self.vertexColors is not None
+
+    def submeshSlices(self):
+        '''Returns a (material, vertexSlice, indexSlice) tuple per material'''
+        return [(m, slice(m.startVertex, m.startVertex + m.numVertices),
+                slice(m.startIndex, m.startIndex + m.numIndices))
+                for m in self.materials]
+
+    def submesh(self, materialId):
+        '''Returns the index and position arrays of one material as views'''
+        m, vertexSlice, indexSlice = self.submeshSlices()[materialId]
+        return self.indices[indexSlice], self.positions[vertexSlice]
+
+class sknMappedFile():
+    '''Memory mapped, read-only view of a SKN file.
+
+    Only the header, material table and meta data are parsed on open.  The
+    index and vertex blocks are exposed as lazy NumPy views straight into the
+    mapped file; nothing is copied until a consumer touches the data.  The
+    views are read-only and must not be used after close().
+
+    with sknMappedFile(path) as skn:
+        print(skn.metaData.numVertices, skn.positions.min(axis=0))
+    '''
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._fid = open(filepath, 'rb')
+        try:
+            self._map = mmap.mmap(self._fid.fileno(), 0, access=mmap.ACCESS_READ)
+        except:
+            self._fid.close()
+            raise
+        self._views = {}
+
+        #__exit__ never runs when __init__ fails, so close here
+        try:
+            self.header, self.materials, self.metaData = readSKNHeaders(
+                    self._map, verbose=False)
+            self.vertexDtype = sknVertexDtype(self.metaData)
+            self.indexOffset = self._map.tell()
+            self.vertexOffset = self.indexOffset + \
+                    self.metaData.numIndices * sknIndexDtype.itemsize
+            self.endOffset = self.vertexOffset + \
+                    self.metaData.numVertices * self.vertexDtype.itemsize
+            if self.endOffset > len(self._map):
+                raise ValueError("%s is truncated, expected at least %d bytes" %
+                        (filepath, self.endOffset))
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''Drops the cached views and unmaps the file.  If a consumer still
+        holds one of the views the mapping stays alive until it is released'''
+        self._views.clear()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+        self._fid.close()
+
+    def _view(self, name):
+        try:
+            return self._views[name]
+        except KeyError:
+            pass
+
+        if name == 'indices':
+            view = np.frombuffer(self._map, dtype=sknIndexDtype,
+                    count=self.metaData.numIndices, offset=self.indexOffset)
+        elif name == 'vertices':
+            view = np.frombuffer(self._map, dtype=self.vertexDtype,
+                    count=self.metaData.numVertices, offset=self.vertexOffset)
+        else:
+            view = self._view('vertices')[name]
+        self._views[name] = view
+        return view
+
+    @property
+    def indices(self):
+        return self._view('indices')
+
+    @property
+    def vertices(self):
+        '''The raw structured vertex block'''
+        return self._view('vertices')
+
+    @property
+    def positions(self):
+        return self._view('position')
+
+    @property
+    def normals(self):
+        return self._view('normal')
+
+    @property
+    def texcoords(self):
+        return self._view('texcoords')
+
+    @property
+    def boneIndices(self):
+        return self._view('boneIndex')
+
+    @property
+    def weights(self):
+        return self._view('weights')
+
+    @property
+    def vertexColors(self):
+        '''uint8 RGBA colors, or None if the file has no vertex colors'''
+        if 'vertexColor' not in self.vertexDtype.names:
+            return None
+        return self._view('vertexColor')
+
+    def toMesh(self):
+        '''Copies the mapped geometry into an SknMesh'''
+        return SknMesh.fromVertexBlock(self.indices, self.vertices,
+                self.materials)
+
 class scoObject():
 
     def __init__(self):
@@ -241,16 +458,24 @@ class scoObject():
         self.materialDict = {}
 
 
-def importSKN(filepath):
-    sknFid = open(filepath, 'rb')
-    print("Reading SKN: %s" % filepath)
-    #filepath = path.split(file)[-1]
-    #print(filepath)
+def sknVertexDtype(metaData):
+    '''Returns the structured dtype matching the vertex block of metaData'''
+    if metaData.containsVertexColor or metaData.vertexBlockSize == 56:
+        dtype = sknVertexDtype56
+    else:
+        dtype = sknVertexDtype52
+
+    if metaData.vertexBlockSize not in [None, dtype.itemsize]:
+        raise ValueError("Unsupported vertex block size %s" % metaData.vertexBlockSize)
+    return dtype
+
+def readSKNHeaders(sknFid, verbose=True):
+    '''Reads the sknHeader, sknMaterial table and sknMetaData at the start of
+    a SKN file, leaving sknFid at the index block'''
     header = sknHeader()
-    header.fromFile(sknFid)
+    header.fromFile(sknFid, verbose)
 
     materials = []
-    
     for k in range(header.numMaterials):
         materials.append(sknMaterial())
         materials[-1].fromFile(sknFid, header.version)
@@ -260,71 +485,352 @@ def importSKN(filepath):
     if (header.version == 0):
         metaData.numIndices = materials[0].numIndices
         metaData.numVertices = materials[0].numVertices
+    return header, materials, metaData
+
+def peekSKN(filepath):
+    '''Reads only the headers of a SKN file, none of the geometry.
+
+    Returns a dict with the parsed 'header', 'materials' and 'metaData', the
+    counts, and the byte offsets of the index block, vertex block and end
+    of the geometry.  For v2+ files header.endTab is read as well, so the
+    header can be written back as is.'''
+    with open(filepath, 'rb') as sknFid:
+        header, materials, metaData = readSKNHeaders(sknFid, verbose=False)
+        indexOffset = sknFid.tell()
+        vertexSize = sknVertexDtype(metaData).itemsize
+        vertexOffset = indexOffset + metaData.numIndices * sknIndexDtype.itemsize
+        endOffset = vertexOffset + metaData.numVertices * vertexSize
+        fileSize = os.fstat(sknFid.fileno()).st_size
+        if header.version >= 2 and fileSize >= endOffset + 12:
+            sknFid.seek(endOffset)
+            header.endTab = list(struct.unpack('<3i', sknFid.read(12)))
+
+    return {'header': header,
+            'materials': materials,
+            'metaData': metaData,
+            'version': header.version,
+            'numMaterials': header.numMaterials,
+            'numIndices': metaData.numIndices,
+            'numVertices': metaData.numVertices,
+            'vertexSize': vertexSize,
+            'containsVertexColor': bool(metaData.containsVertexColor),
+            'indexOffset': indexOffset,
+            'vertexOffset': vertexOffset,
+            'endOffset': endOffset,
+            'fileSize': fileSize}
+
+def readSKNIndices(sknFid, numIndices):
+    '''Reads the whole index block in one go as a uint16 array'''
+    size = numIndices * sknIndexDtype.itemsize
+    buf = sknFid.read(size)
+    if len(buf) != size:
+        raise ValueError("Index block truncated, expected %d bytes got %d" % (size, len(buf)))
+    return np.frombuffer(buf, dtype=sknIndexDtype)
+
+def readSKNVertices(sknFid, metaData):
+    '''Reads the whole vertex block in one go as a structured array.
+
+    Fields are position, boneIndex, weights, normal, texcoords and, for
+    56 byte vertices, vertexColor (raw uint8 0-255)'''
+    dtype = sknVertexDtype(metaData)
+    size = metaData.numVertices * dtype.itemsize
+    buf = sknFid.read(size)
+    if len(buf) != size:
+        raise ValueError("Vertex block truncated, expected %d bytes got %d" % (size, len(buf)))
+    return np.frombuffer(buf, dtype=dtype)
 
-    indices = []
-    vertices = []
-    for k in range(metaData.numIndices):
-        buf = sknFid.read(struct.calcsize('<h'))
-        indices.append(struct.unpack('<h', buf)[0])
+def importSKN(filepath):
+    sknFid = open(filepath, 'rb')
+    log.debug("Reading SKN: %s", filepath)
+    #filepath = path.split(file)[-1]
+    #print(filepath)
+    header, materials, metaData = readSKNHeaders(sknFid)
 
-    for k in range(metaData.numVertices):
-        vertices.append(sknVertex())
-        vertices[-1].fromFile(sknFid, metaData.containsVertexColor)
+    indices = readSKNIndices(sknFid, metaData.numIndices)
+    vertices = readSKNVertices(sknFid, metaData)
+    mesh = SknMesh.fromVertexBlock(indices, vertices, materials)
 
     # exclusive to version two+.
     if header.version >= 2:  # stuck in header b/c nowhere else for it
-        header.endTab = [struct.unpack('<3i', sknFid.read(struct.calcsize('<3i')))]
+        header.endTab = list(struct.unpack('<3i', sknFid.read(struct.calcsize('<3i'))))
 
     sknFid.close()
 
-    return header, materials, metaData, indices, vertices
-
-def skn2obj(header, materials, indices, vertices):
-    objStr=""
-    if header.version > 0:
-        objStr+="g mat_%s\n" %(materials[0].name)
-    for vtx in vertices:
-        objStr+="v %f %f %f\n" %(vtx.position)
-        objStr+="vn %f %f %f\n" %(vtx.normal)
-        objStr+="vt %f %f\n" %(vtx.texcoords[0], 1-vtx.texcoords[1])
-
-    tmp = int(len(indices)/3)
-    for idx in range(tmp):
-        a = indices[3*idx][0] + 1
-        b = indices[3*idx + 1][0] + 1
-        c = indices[3*idx + 2][0] + 1
-        objStr+="f %d/%d/%d" %(a,a,a)
-        objStr+=" %d/%d/%d" %(b,b,b)
-        objStr+=" %d/%d/%d\n" %(c,c,c)
-
-    return objStr
-
-def buildMesh(filepath,header, materials, metaData, indices, vertices):
+    return header, materials, metaData, mesh
+
+def _quantize(values, tolerance):
+    '''Snaps values to a grid of size tolerance and returns int64 keys.  With
+    no tolerance the raw float32 bit patterns are used, so only exact
+    duplicates compare equal'''
+    values = np.asarray(values, dtype=np.float32)
+    if tolerance > 0:
+        return np.rint(values / tolerance).astype(np.int64)
+    #+0.0 folds -0.0 into 0.0
+    return (values + np.float32(0.0)).view(np.int32).astype(np.int64)
+
+def dedupeVertices(vertexIds, uvs, colors=None, positions=None,
+        uvTolerance=0.0, positionTolerance=0.0):
+    '''Collapses per-loop attributes into unique SKN vertices.
+
+    vertexIds, uvs (and optionally colors) hold one row per loop.  Each loop
+    is packed into a fixed-width key of (vertex index, UV, RGBA8 color) and
+    run through np.unique.  With positionTolerance > 0 the vertex index is
+    replaced by the position (positions[vertexIds]) snapped to that grid so
+    near-identical seam vertices collapse; uvTolerance does the same for UVs.
+
+    Returns (indices, uniqueLoops): indices maps every loop to its unique
+    vertex and uniqueLoops holds the first loop of every unique vertex.
+    Unique vertices are numbered in first-seen order.'''
+    vertexIds = np.asarray(vertexIds, dtype=np.int64)
+    if len(vertexIds) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    if positionTolerance > 0 and positions is not None:
+        columns = [_quantize(np.asarray(positions)[vertexIds], positionTolerance)]
+    else:
+        columns = [vertexIds[:, None]]
+    columns.append(_quantize(np.asarray(uvs).reshape(-1, 2), uvTolerance))
+    if colors is not None:
+        rgba = np.rint(np.clip(np.asarray(colors, dtype=np.float32).reshape(-1, 4),
+                0.0, 1.0) * 255.0).astype(np.uint8)
+        columns.append(rgba.view('<u4').astype(np.int64))
+
+    keys = np.ascontiguousarray(np.hstack(columns))
+    keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+    _, firstLoops, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    #np.unique sorts the keys, renumber them in first-seen order
+    order = np.argsort(firstLoops, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[inverse.ravel()], firstLoops[order]
+
+def limitBoneInfluences(vertexIds, groupIds, weights, numVertices, maxInfluences=4):
+    '''Reduces a sparse vertex->(group, weight) table to the fixed number of
+    influences the SKN vertex layout can hold.
+
+    vertexIds, groupIds and weights are parallel arrays with one entry per
+    influence.  The largest maxInfluences weights of every vertex are kept
+    (argpartition, no per-vertex sort) and renormalized to sum to 1.
+    Returns (boneIndices uint8[numVertices, maxInfluences],
+    weights float32[numVertices, maxInfluences], zeroWeight bool[numVertices])
+    where zeroWeight flags vertices without any positive weight; those keep
+    all-zero weights.'''
+    vertexIds = np.asarray(vertexIds, dtype=np.int64)
+    groupIds = np.asarray(groupIds, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+    if len(groupIds) and (groupIds.min() < 0 or groupIds.max() > 255):
+        raise ValueError("Bone index out of range, SKN files only support 256 bones")
+
+    #Scatter the sparse table into a dense [numVertices, K] table, where K is
+    #the largest number of influences of a single vertex
+    order = np.argsort(vertexIds, kind='stable')
+    vertexIds = vertexIds[order]
+    counts = np.bincount(vertexIds, minlength=numVertices)
+    starts = np.cumsum(counts) - counts
+    slots = np.arange(len(vertexIds)) - starts[vertexIds]
+    numSlots = max(maxInfluences, int(counts.max()) if len(counts) else 0)
+
+    denseGroups = np.zeros((numVertices, numSlots), dtype=np.uint8)
+    denseWeights = np.zeros((numVertices, numSlots), dtype=np.float32)
+    denseGroups[vertexIds, slots] = groupIds[order]
+    denseWeights[vertexIds, slots] = np.maximum(weights[order], 0.0)
+
+    if numSlots > maxInfluences:
+        #Pick the largest weights per vertex, then order them descending
+        top = np.argpartition(-denseWeights, maxInfluences - 1, axis=1)[:, :maxInfluences]
+        topWeights = np.take_along_axis(denseWeights, top, axis=1)
+        top = np.take_along_axis(top, np.argsort(-topWeights, axis=1, kind='stable'), axis=1)
+        denseGroups = np.take_along_axis(denseGroups, top, axis=1)
+        denseWeights = np.take_along_axis(denseWeights, top, axis=1)
+
+    #Renormalize so the kept weights sum to 1
+    weightSum = denseWeights.sum(axis=1)
+    zeroWeight = weightSum <= 0.0
+    weightSum[zeroWeight] = 1.0
+    denseWeights /= weightSum[:, None]
+    return denseGroups, denseWeights, zeroWeight
+
+def packSKNVertices(mesh, containsVertexColor=None):
+    '''Interleaves the attribute arrays of mesh into the 52 or 56 byte vertex
+    layout, ready to be written as one block'''
+    if containsVertexColor is None:
+        containsVertexColor = mesh.containsVertexColor
+    if containsVertexColor:
+        vertices = np.empty(mesh.numVertices, dtype=sknVertexDtype56)
+        if mesh.vertexColors is None:
+            vertices['vertexColor'] = 0
+        else:
+            vertices['vertexColor'] = mesh.vertexColors
+    else:
+        vertices = np.empty(mesh.numVertices, dtype=sknVertexDtype52)
+    vertices['position'] = mesh.positions
+    vertices['boneIndex'] = mesh.boneIndices
+    vertices['weights'] = mesh.weights
+    vertices['normal'] = mesh.normals
+    vertices['texcoords'] = mesh.texcoords
+    return vertices
+
+def writeSKN(sknFid, header, metaData, mesh):
+    '''Writes a complete SKN file for mesh.
+
+    The header, material table, index block and interleaved vertex block are
+    assembled in memory and emitted with a single write.  Vertex colors are
+    only written for version 4, the only version with a color flag.  Version
+    0 files hold a single material and only store its counts.'''
+    version = header.version
+    checkSKNIndices(mesh.indices, mesh.numVertices)
+    if version == 0 and len(mesh.materials) > 1:
+        raise ValueError("Version 0 SKN files have one material, got %d" %
+                len(mesh.materials))
+    containsVertexColor = version == 4 and mesh.containsVertexColor
+    metaData.numIndices = mesh.numIndices
+    metaData.numVertices = mesh.numVertices
+    metaData.containsVertexColor = int(containsVertexColor)
+    if containsVertexColor:
+        metaData.vertexBlockSize = sknVertexDtype56.itemsize
+    else:
+        metaData.vertexBlockSize = sknVertexDtype52.itemsize
+
+    buf = io.BytesIO()
+    header.numMaterials = len(mesh.materials)
+    header.toFile(buf)
+    if version == 0:
+        buf.write(struct.pack('<2I', mesh.numIndices, mesh.numVertices))
+    else:
+        if header.numObjects > 0:  # if materials exist
+            for mat in mesh.materials:
+                mat.toFile(buf)
+        metaData.toFile(buf, version)
+
+    buf.write(mesh.indices.astype(sknIndexDtype, copy=False).tobytes())
+    buf.write(packSKNVertices(mesh, containsVertexColor).tobytes())
+
+    if version >= 2:  # some extra ints in v2+. not sure what they do, non-0 in v4?
+        if header.endTab is None or len(header.endTab) < 3:
+            header.endTab = [0, 0, 0]
+        buf.write(struct.pack('<3i', *header.endTab[0:3]))
+
+    sknFid.write(buf.getbuffer())
+
+def _formatRows(fmt, rows):
+    '''Formats every row of a 2D array with fmt in one string operation'''
+    return (fmt * len(rows)) % tuple(rows.ravel().tolist())
+
+def writeOBJ(objFid, mesh, chunkSize=65536):
+    '''Streams mesh as Wavefront OBJ text into objFid, with a 'g' group per
+    material.  Works on an SknMesh or an sknMappedFile; rows are formatted
+    chunkSize at a time so memory use does not grow with the mesh.'''
+    numVertices = len(mesh.positions)
+    for start in range(0, numVertices, chunkSize):
+        objFid.write(_formatRows("v %f %f %f\n",
+                mesh.positions[start:start + chunkSize]))
+    for start in range(0, numVertices, chunkSize):
+        objFid.write(_formatRows("vn %f %f %f\n",
+                mesh.normals[start:start + chunkSize]))
+    for start in range(0, numVertices, chunkSize):
+        texcoords = np.array(mesh.texcoords[start:start + chunkSize], dtype=np.float64)
+        texcoords[:, 1] = 1 - texcoords[:, 1]
+        objFid.write(_formatRows("vt %f %f\n", texcoords))
+
+    for material in mesh.materials:
+        objFid.write("g mat_%s\n" % material.name)
+        end = material.startIndex + material.numIndices
+        for start in range(material.startIndex, end, chunkSize * 3):
+            faces = mesh.indices[start:min(start + chunkSize * 3, end)]
+            #OBJ indices are 1-based, v/vt/vn share the same index
+            faces = np.repeat(faces.astype(np.int64) + 1, 3).reshape(-1, 9)
+            objFid.write(_formatRows("f %d/%d/%d %d/%d/%d %d/%d/%d\n", faces))
+
+def writePLY(plyFid, mesh, chunkSize=65536):
+    '''Streams mesh as a binary little endian PLY into plyFid (opened 'wb'),
+    with positions, normals, UVs and, if present, RGBA vertex colors.
+    Works on an SknMesh or an sknMappedFile, chunkSize rows at a time.'''
+    numVertices = len(mesh.positions)
+    numFaces = len(mesh.indices) // 3
+    hasColor = mesh.vertexColors is not None
+
+    vertexFields = [('position', '<f4', (3,)), ('normal', '<f4', (3,)),
+            ('texcoords', '<f4', (2,))]
+    header = ["ply", "format binary_little_endian 1.0",
+            "comment lolblender SKN export",
+            "element vertex %d" % numVertices,
+            "property float x", "property float y", "property float z",
+            "property float nx", "property float ny", "property float nz",
+            "property float s", "property float t"]
+    if hasColor:
+        vertexFields.append(('color', 'u1', (4,)))
+        header += ["property uchar red", "property uchar green",
+                "property uchar blue", "property uchar alpha"]
+    header += ["element face %d" % numFaces,
+            "property list uchar int vertex_indices", "end_header", ""]
+    plyFid.write("\n".join(header).encode('ascii'))
+
+    vertexDtype = np.dtype(vertexFields)
+    for start in range(0, numVertices, chunkSize):
+        end = min(start + chunkSize, numVertices)
+        vertices = np.empty(end - start, dtype=vertexDtype)
+        vertices['position'] = mesh.positions[start:end]
+        vertices['normal'] = mesh.normals[start:end]
+        vertices['texcoords'] = mesh.texcoords[start:end]
+        vertices['texcoords'][:, 1] = 1 - vertices['texcoords'][:, 1]
+        if hasColor:
+            vertices['color'] = mesh.vertexColors[start:end]
+        plyFid.write(vertices.tobytes())
+
+    faceDtype = np.dtype([('count', 'u1'), ('vertices', '<i4', (3,))])
+    for start in range(0, numFaces, chunkSize):
+        end = min(start + chunkSize, numFaces)
+        faces = np.empty(end - start, dtype=faceDtype)
+        faces['count'] = 3
+        faces['vertices'] = mesh.indices[start * 3:end * 3].reshape(-1, 3)
+        plyFid.write(faces.tobytes())
+
+def skn2obj(header, materials, mesh):
+    '''Returns mesh as an OBJ string, see writeOBJ for streaming to a file'''
+    objStr = io.StringIO()
+    writeOBJ(objStr, mesh)
+    return objStr.getvalue()
+
+def writeColorLayer(meshData, name, colors, loopVerts, POINT_COLORS=True):
+    '''Creates the color layer name on a Blender mesh from per-vertex float
+    colors with one foreach_set call.
+
+    With POINT_COLORS and a Blender that has color_attributes with sRGB
+    access, a point domain byte color attribute is created so no per-loop
+    expansion is needed.  Otherwise a per-loop vertex_colors layer is
+    filled by gathering colors through loopVerts.'''
+    import bpy
+
+    colorAttributes = getattr(meshData, 'color_attributes', None)
+    if POINT_COLORS and colorAttributes is not None and \
+            'color_srgb' in bpy.types.ByteColorAttributeValue.bl_rna.properties:
+        layer = colorAttributes.new(name=name, type='BYTE_COLOR', domain='POINT')
+        layer.data.foreach_set('color_srgb', np.ascontiguousarray(colors, dtype=np.float32).ravel())
+    else:
+        layer = meshData.vertex_colors.new(name=name)
+        layer.data.foreach_set('color', np.ascontiguousarray(colors[loopVerts], dtype=np.float32).ravel())
+    return layer
+
+def buildMesh(filepath,header, materials, metaData, mesh, POINT_COLORS=True):
     import bpy
     from os import path
-    #(header, materials, metaData, indices, vertices) = importSKN(filepath)
-    import bmesh
+    #(header, materials, metaData, mesh) = importSKN(filepath)
     
     ''' 
     if header.version > 0 and materials[0].numMaterials == 2:
         print('ERROR:  Skins with numMaterials = 2 are currently unreadable.  Exiting')
         return{'CANCELLED'} 
     '''
-    numIndices = len(indices)
-    numVertices = len(vertices)
-    #Create face groups
-    faceList = []
-    for k in range(0, numIndices, 3):
-        #faceList.append( [indices[k], indices[k+1], indices[k+2]] )
-        faceList.append( indices[k:k+3] )
-
-    vtxList = []
-    normList = []
-    uvList = []
-    for vtx in vertices:
-        vtxList.append((vtx.position[0], vtx.position[2], vtx.position[1]*-1))
-        normList.extend( vtx.normal[:] )
-        uvList.append( [vtx.texcoords[0], 1-vtx.texcoords[1]] )
+    numIndices = mesh.numIndices
+    numVertices = mesh.numVertices
+    numFaces = numIndices // 3
+
+    #SKN -> Blender axes, (x, y, z) -> (x, z, -y) in one go
+    vtxList = mesh.positions[:, [0, 2, 1]] * np.array((1, 1, -1), dtype=np.float32)
+    normList = mesh.normals.ravel().tolist()
+    uvList = np.column_stack((mesh.texcoords[:, 0],
+            1 - mesh.texcoords[:, 1]))
 
     #Build the mesh
     #Get current scene
@@ -334,14 +840,24 @@ def buildMesh(filepath,header, materials, metaData, indices, vertices):
     #Use the filename base as the meshname.  i.e. path/to/Akali.skn -> Akali
     meshName = path.split(filepath)[-1]
     meshName = path.splitext(meshName)[0]
-    mesh = bpy.data.meshes.new(meshName)
-    mesh.from_pydata(vtxList, [], faceList)
-    mesh.update()
+    meshData = bpy.data.meshes.new(meshName)
+
+    #Every face is a triangle, so the loops are the index buffer as is
+    meshData.vertices.add(numVertices)
+    meshData.vertices.foreach_set('co', vtxList.ravel())
+    meshData.loops.add(numIndices)
+    meshData.loops.foreach_set('vertex_index', mesh.indices.astype(np.int32))
+    meshData.polygons.add(numFaces)
+    meshData.polygons.foreach_set('loop_start', np.arange(0, numIndices, 3, dtype=np.int32))
+    if bpy.app.version < (4, 0, 0):
+        #read-only from 4.0 on, derived from loop_start
+        meshData.polygons.foreach_set('loop_total', np.full(numFaces, 3, dtype=np.int32))
+    meshData.update(calc_edges=True)
 
     bpy.ops.object.select_all(action='DESELECT')
     
     #Create object from mesh
-    obj = bpy.data.objects.new('lolMesh', mesh)
+    obj = bpy.data.objects.new('lolMesh', meshData)
 
     #Link object to the current scene
     #scene.objects.link(obj)
@@ -349,93 +865,71 @@ def buildMesh(filepath,header, materials, metaData, indices, vertices):
     bpy.context.collection.objects.link(obj)
 
 
-    if metaData.containsVertexColor:
-        #Create vertex color layer
-        obj.data.vertex_colors.new(name="lolVertexColor")
-        vertColorLayer = obj.data.vertex_colors[-1]
-        for k, loop in enumerate(obj.data.loops):
-            vertIndex = loop.vertex_index
-            vertColorLayer.data[k].color = vertices[vertIndex].vertexColor[0:4]
-        obj.data.vertex_colors.new(name="lolVertexColorAlpha")
-        vertColorAlphaLayer = obj.data.vertex_colors[-1]
-        for k, loop in enumerate(obj.data.loops):
-            alphaValue = vertices[loop.vertex_index].vertexColor[3]
-            vertColorAlphaLayer.data[k].color = (alphaValue, 0.0, 0.0, 0.0)
+    if mesh.containsVertexColor:
+        vertexColors = mesh.vertexColors / np.float32(255.0)
+        #alpha value goes into the red channel of its own layer
+        vertexAlphas = np.zeros_like(vertexColors)
+        vertexAlphas[:, 0] = vertexColors[:, 3]
+        #Create vertex color layers
+        writeColorLayer(meshData, 'lolVertexColor', vertexColors, mesh.indices, POINT_COLORS)
+        writeColorLayer(meshData, 'lolVertexColorAlpha', vertexAlphas, mesh.indices, POINT_COLORS)
     
     #Create UV texture coords
-    texList = []
     uvtexName = 'lolUVtex'
     #obj.data.uv_textures.new(uvtexName)
 
     obj.data.uv_layers.new(name=uvtexName)
 
     uv_layer = obj.data.uv_layers[-1].data  # sets layer to the above texture
-    set = []
-    for k, loop in enumerate(obj.data.loops):
-        # data.loops contains the vertex of tris
-        # k/3 = triangle #
-        # k%3 = vertex number in that triangle
-        v = loop.vertex_index  # "index" number
-        set.append(uvList[v][0])  # u
-        set.append(uvList[v][1])  # v
-    uv_layer.foreach_set("uv", set)
+    # data.loops contains the vertex of tris, in index buffer order
+    uv_layer.foreach_set("uv", uvList[mesh.indices].ravel())
 
     #Set normals
     #Needs to be done after the UV unwrapping 
     obj.data.vertices.foreach_set('normal', normList) 
 
-    for m in materials:
-        tex = bpy.data.textures.new(m.name + '_texImage', type='IMAGE')
-        
-        #mat = bpy.data.materials.new(m.name)
-        #mat.use_shadeless = True
-        #mtex = mat.texture_paint_slots.add()
-        #mtex.texture = tex
-        #mtex.texture_coords = 'UV'
-        #mtex.use_map_color_diffuse = True
-
-        mat = bpy.data.materials.new(name=m.name)
-        
-        mat.use_nodes = True
-        bsdf = mat.node_tree.nodes["Principled BSDF"]
-        texImage = mat.node_tree.nodes.new('ShaderNodeTexImage')
-        #texImage.image = bpy.data.images.load("C:\\path\\to\\im.jpg")
+    with lolLog.phase('materials', records=len(materials)):
+        for m in materials:
+            tex = bpy.data.textures.new(m.name + '_texImage', type='IMAGE')
 
-        mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
+            #mat = bpy.data.materials.new(m.name)
+            #mat.use_shadeless = True
+            #mtex = mat.texture_paint_slots.add()
+            #mtex.texture = tex
+            #mtex.texture_coords = 'UV'
+            #mtex.use_map_color_diffuse = True
 
-        obj.data.materials.append(mat)
-    
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.mode_set(mode='EDIT')
-    
-    bm = bmesh.from_edit_mesh(obj.data)
-    bm.verts.ensure_lookup_table()
+            mat = bpy.data.materials.new(name=m.name)
+
+            mat.use_nodes = True
+            bsdf = mat.node_tree.nodes["Principled BSDF"]
+            texImage = mat.node_tree.nodes.new('ShaderNodeTexImage')
+            #texImage.image = bpy.data.images.load("C:\\path\\to\\im.jpg")
+
+            mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
+
+            obj.data.materials.append(mat)
     
+    #Assign every triangle to the material whose index range contains it
+    faceMaterials = np.zeros(numFaces, dtype=np.int32)
     for m, material in enumerate(materials):
-        bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.context.active_object.active_material_index = m
-        
-        for i in range(material.startIndex, material.startIndex + material.numIndices, 3):
-            f = bm.faces.get([bm.verts[indices[i]], bm.verts[indices[i+1]], bm.verts[indices[i+2]]])
-            f.select = True
-        
-        bpy.ops.object.material_slot_assign()
-    
-    bm.free()
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
+        faceMaterials[material.startIndex // 3:
+                (material.startIndex + material.numIndices) // 3] = m
+    meshData.polygons.foreach_set('material_index', faceMaterials)
+
+    bpy.context.view_layer.objects.active = obj
     
     #Create material
     #materialName = 'lolMaterial'
     #material = bpy.data.materials.ne(materialName)
-    mesh.update() 
+    meshData.update() 
 
     #set active
     obj.select_set(True)
 
     return {'FINISHED'}
     
-def addDefaultWeights(boneList, sknVertices, armatureObj, meshObj):
+def addDefaultWeights(boneNames, mesh, armatureObj, meshObj, weightPrecision=5):
 
     '''Add an armature modifier to the mesh'''
     meshObj.modifiers.new(name='Armature', type='ARMATURE')
@@ -446,27 +940,72 @@ def addDefaultWeights(boneList, sknVertices, armatureObj, meshObj):
     the intended bone.  I.E. the bone 'L_Hand' deforms vertices in the group
     'L_Hand'.
 
-    We will create a vertex group for each bone using their index number
+    We will create a vertex group for each bone using their index number,
+    boneNames lists the bone of every vertex bone index
     '''
 
-    for id, bone in     (boneList):
-        meshObj.vertex_groups.new(name=bone.name)
+    for name in boneNames:
+        meshObj.vertex_groups.new(name=name)
 
     '''
-    Loop over vertices by index & add weights
+    Bucket the (vertex, weight) pairs per bone so each vertex group gets one
+    add() call per distinct weight instead of four calls per vertex.  Weights
+    are rounded to weightPrecision decimals to form the buckets.
     '''
-    for vtx_idx, vtx in enumerate(sknVertices):
-        for k in range(4):
-            boneId = vtx.boneIndex[k]
-            weight = vtx.weights[k]
-
-            meshObj.vertex_groups[boneId].add([vtx_idx],
-                    weight,
-                    'ADD')
-
-def exportSKN(meshObj, output_filepath, input_filepath, BASE_ON_IMPORT, VERSION):
+    numGroups = len(meshObj.vertex_groups)
+    vertexIds = np.repeat(np.arange(mesh.numVertices, dtype=np.int64), 4)
+    boneIds = mesh.boneIndices.ravel().astype(np.int64)
+    weights = mesh.weights.ravel().astype(np.float64)
+    keep = (weights > 0.0) & (boneIds < numGroups)
+    vertexIds, boneIds, weights = vertexIds[keep], boneIds[keep], weights[keep]
+
+    #A bone listed twice for one vertex adds up, like the old 'ADD' calls did
+    pairs, inverse = np.unique(vertexIds * numGroups + boneIds, return_inverse=True)
+    weights = np.bincount(inverse.ravel(), weights=weights)
+    vertexIds = pairs // numGroups
+    boneIds = pairs % numGroups
+    weights = np.round(weights, weightPrecision)
+
+    order = np.lexsort((vertexIds, weights, boneIds))
+    vertexIds, boneIds, weights = vertexIds[order], boneIds[order], weights[order]
+    bucketStarts = np.flatnonzero(np.diff(boneIds, prepend=-1) |
+            (np.diff(weights, prepend=-1.0) != 0.0))
+    bucketEnds = np.append(bucketStarts[1:], len(vertexIds))
+
+    #No bulk deform-layer write exists to prefer: vertex groups have no
+    #foreach_set in any Blender version, so bucketed add() is the only path
+    vertexIds = vertexIds.tolist()
+    for start, end in zip(bucketStarts.tolist(), bucketEnds.tolist()):
+        meshObj.vertex_groups[int(boneIds[start])].add(vertexIds[start:end],
+                float(weights[start]), 'REPLACE')
+
+def readColorLayer(mesh, name, loopVerts):
+    '''Returns the color layer name of a Blender mesh as a per-loop float32
+    [numLoops, 4] array, or None if there is no such layer.  Point domain
+    color attributes are expanded to loops through loopVerts.  Byte colors
+    are read in sRGB so the stored bytes round-trip unchanged.'''
+    colorAttributes = getattr(mesh, 'color_attributes', None)
+    if colorAttributes is not None:
+        layer = colorAttributes.get(name)
+    else:
+        layer = mesh.vertex_colors.get(name)
+    if layer is None:
+        return None
+
+    prop = 'color'
+    if getattr(layer, 'data_type', None) == 'BYTE_COLOR' and len(layer.data) \
+            and hasattr(layer.data[0], 'color_srgb'):
+        prop = 'color_srgb'
+    colors = np.empty(len(layer.data) * 4, dtype=np.float32)
+    layer.data.foreach_get(prop, colors)
+    colors = colors.reshape(-1, 4)
+    if getattr(layer, 'domain', 'CORNER') == 'POINT':
+        colors = colors[loopVerts]
+    return colors
+
+def exportSKN(meshObj, output_filepath, input_filepath, BASE_ON_IMPORT, VERSION,
+        UV_TOLERANCE=0.0, POSITION_TOLERANCE=0.0):
     import bpy
-    import bmesh
     import math
 
     if VERSION not in [1,2,4] and not BASE_ON_IMPORT:
@@ -479,107 +1018,110 @@ def exportSKN(meshObj, output_filepath, input_filepath, BASE_ON_IMPORT, VERSION)
     bpy.ops.transform.rotate(value=-(math.radians(90)), orient_axis='X', orient_type='GLOBAL', orient_matrix=((1, 0, 0), (0, 1, 0), (0, 0, 1)), orient_matrix_type='GLOBAL', constraint_axis=(True, False, False), mirror=True, use_proportional_edit=False, proportional_edit_falloff='SMOOTH', proportional_size=1, use_proportional_connected=False, use_proportional_projected=False)
     bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
 
-    
-    containsVertexColor = ('lolVertexColor' in meshObj.data.vertex_colors) and ('lolVertexColorAlpha' in meshObj.data.vertex_colors)
-    
-    #Build vertex data lists and dictionary of vertex-uv pairs
-    vertexUvs = OrderedDict()
-    vertices = []
-    vertexNormals = []
-    vertexWeights = []
-    vtxColors = []
-    indices = []
-    
-    #Read materials
-    matHeaders = []
-    
-    bpy.ops.object.mode_set(mode='EDIT')
-    
-    bm = bmesh.from_edit_mesh(meshObj.data)
-    bm.verts.ensure_lookup_table()
-    bm.verts.index_update()
-    bm.faces.index_update()
-    for f in bm.faces:
-        for l in f.loops:
-            l.index = -1
-    
-    #bmesh data layers
-    weightLayer = bm.verts.layers.deform.active
-    uvLayer = bm.loops.layers.uv['lolUVtex']
+    #Pull everything out of the mesh with foreach_get, no Edit Mode needed
+    mesh = meshObj.data
+    numMeshVerts = len(mesh.vertices)
+    positions = np.empty(numMeshVerts * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', positions)
+    positions = positions.reshape(-1, 3)
+    normals = np.empty(numMeshVerts * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('normal', normals)
+    normals = normals.reshape(-1, 3)
+
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    loopUvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers['lolUVtex'].data.foreach_get('uv', loopUvs)
+    loopUvs = loopUvs.reshape(-1, 2)
+
+    meshColors = readColorLayer(mesh, 'lolVertexColor', loopVerts)
+    meshAlphas = readColorLayer(mesh, 'lolVertexColorAlpha', loopVerts)
+    containsVertexColor = meshColors is not None and meshAlphas is not None
     if containsVertexColor:
-        vertexColorLayer = bm.loops.layers.color['lolVertexColor']
-        vertexColorAlphaLayer = bm.loops.layers.color['lolVertexColorAlpha']
-    
-    for m, matSlot in enumerate(meshObj.material_slots):
-        bpy.ops.mesh.select_all(action='DESELECT')
-        bpy.context.active_object.active_material_index = m
-        bpy.ops.object.material_slot_select()
-        
-        matStartVert = len(vertices)
-        matStartIndex = len(indices)
-        
-        for f in bm.faces:
-            if f.select == True:
-                #check if the face is a triangle
-                if (len(f.verts) != 3):
-                    raise ValueError("Found a face which is not a triangle. Every face has to be a triangle!")
-                
-                for loop in f.loops:
-                    #every vertex should have one uv coordinate -> every loop with unique uv or vert coordinate exports as unique vertex
-                    loopId = loop[uvLayer].uv[:] + loop.vert.co[:]
-                    if loopId not in vertexUvs:
-                        loop.index = len(vertices)
-                        vertices.append(loop.vert.co[:])
-                        vertexNormals.append(loop.vert.normal[:])
-                        vertexWeights.append(loop.vert[weightLayer].items())
-                        vertexUvs[loopId] = loop.index
-                        if containsVertexColor:
-                            vtxColor = loop[vertexColorLayer][0:3]
-                            vtxColorAlpha = loop[vertexColorAlphaLayer][:1]
-                            #append alpha value from different layer
-                            vtxColor = vtxColor + vtxColorAlpha
-                            vtxColors.append(vtxColor)
-                        
-                    indices.append(vertexUvs[loopId])
-        
-        indexCount = len(indices) - matStartIndex
-        vertCount = len(vertices) - matStartVert
-        matHeaders.append(sknMaterial(matSlot.material.name, matStartVert, vertCount, matStartIndex, indexCount))
-    
-    bm.free()
-    bpy.ops.mesh.select_all(action='DESELECT')
-    bpy.ops.object.mode_set(mode='OBJECT')
-    
-    vertexUvs = list(vertexUvs.keys())
-    numMats = len(meshObj.material_slots)
-    numIndices = len(indices)
-    numVertices = len(vertices)
+        #rgb from one layer, alpha value from a different layer
+        loopColors = np.column_stack((meshColors[:, 0:3], meshAlphas[:, 0]))
+    else:
+        loopColors = None
+
+    #Faces are exported as triangles, ngons are triangulated on the fly
+    mesh.calc_loop_triangles()
+    numTris = len(mesh.loop_triangles)
+    triLoops = np.empty(numTris * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('loops', triLoops)
+    triLoops = triLoops.reshape(-1, 3)
+    triPolys = np.empty(numTris, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('polygon_index', triPolys)
+    polyMaterials = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', polyMaterials)
+
+    numMats = max(len(meshObj.material_slots), 1)
+    triMaterials = np.minimum(polyMaterials[triPolys], numMats - 1)
+    #stable, so triangles keep their order inside a submesh
+    triOrder = np.argsort(triMaterials, kind='stable')
+    matTriCounts = np.bincount(triMaterials, minlength=numMats)
+    matTriStarts = np.cumsum(matTriCounts) - matTriCounts
+
+    #Vertex group weights have no foreach_get, collect them as one flat table
+    vertexWeights = [[(g.group, g.weight) for g in v.groups] for v in mesh.vertices]
+
+    #Build the submeshes, one per material slot
+    matHeaders = []
+    indices = []
+    uniqueVerts = []
+    uniqueUvs = []
+    uniqueColors = []
+    numVertices = 0
+    numIndices = 0
+
+    for m in range(numMats):
+        if m < len(meshObj.material_slots) and meshObj.material_slots[m].material is not None:
+            matName = meshObj.material_slots[m].material.name
+        else:
+            matName = 'lolMaterial'
+
+        matTris = triOrder[matTriStarts[m]:matTriStarts[m] + matTriCounts[m]]
+        matLoops = triLoops[matTris].ravel()
+        if containsVertexColor:
+            matColors = loopColors[matLoops]
+        else:
+            matColors = None
+
+        #every loop with a unique vertex/uv(/color) exports as a unique vertex
+        localIndices, uniqueLoops = dedupeVertices(loopVerts[matLoops],
+                loopUvs[matLoops], matColors, positions, UV_TOLERANCE,
+                POSITION_TOLERANCE)
+        uniqueLoops = matLoops[uniqueLoops]
+
+        matHeaders.append(sknMaterial(matName, numVertices,
+                len(uniqueLoops), numIndices, len(localIndices)))
+        indices.append(localIndices + numVertices)
+        uniqueVerts.append(loopVerts[uniqueLoops])
+        uniqueUvs.append(loopUvs[uniqueLoops])
+        if containsVertexColor:
+            uniqueColors.append(loopColors[uniqueLoops])
+        numVertices += len(uniqueLoops)
+        numIndices += len(localIndices)
+
+    indices = np.concatenate(indices)
+    #fail before the uint16 cast could wrap indices of too large meshes
+    checkSKNIndices(indices, numVertices)
+    uniqueVerts = np.concatenate(uniqueVerts)
+    uniqueUvs = np.concatenate(uniqueUvs)
     
     if containsVertexColor:
         vertexBlockSize = 56
     else:
         vertexBlockSize = 52
     
-    boundingBoxMin = meshObj.bound_box[0][0:3]
-    boundingBoxMax = meshObj.bound_box[6][0:3]
-    
-    #approximate bounding sphere
-    sphereCenter = ((boundingBoxMax[0] + boundingBoxMin[0]) * 0.5, (boundingBoxMax[1] + boundingBoxMin[1]) * 0.5, (boundingBoxMax[2] + boundingBoxMin[2]) * 0.5)
-    
-    maxDistance = 0.0
-    for i in range(3):
-        distance = sphereCenter[i] - boundingBoxMin[i]
-        if (distance > maxDistance):
-            maxDistance = distance
-    
-    boundingSpherePos = sphereCenter
-    boundingSphereRadius = maxDistance
+    #Exact box and tight sphere around the exported vertices
+    exportPositions = positions[uniqueVerts]
+    boundingBoxMin, boundingBoxMax = lolBounds.boundingBox(exportPositions)
+    boundingSpherePos, boundingSphereRadius = lolBounds.boundingSphere(exportPositions)
     
     #Write header block
     if BASE_ON_IMPORT:
-        (import_header, import_mats, import_meta_data, import_indices,
-        import_vertices) = importSKN(input_filepath)
-        header = import_header
+        #only the header is reused, no need to decode the geometry
+        header = peekSKN(input_filepath)['header']
         VERSION = header.version
     else:
         header = sknHeader()
@@ -589,85 +1131,40 @@ def exportSKN(meshObj, output_filepath, input_filepath, BASE_ON_IMPORT, VERSION)
 
     meta_data = sknMetaData(0, numIndices, numVertices, vertexBlockSize, containsVertexColor, boundingBoxMin, boundingBoxMax, boundingSpherePos, boundingSphereRadius)
 
-    #create output file 
-    sknFid = open(output_filepath, 'wb')
-    
-    #write header
-    header.numMaterials = numMats
-    header.toFile(sknFid)
-    if header.numObjects > 0:  # if materials exist
-        #We are writing a materials block
-        for mat in matHeaders:
-            mat.toFile(sknFid)
-
-    meta_data.toFile(sknFid, VERSION)
-
-    #write face indices
-    for idx in indices:
-        buf = struct.pack('<h', idx)
-        sknFid.write(buf)
-    
-    #Write vertices
-    sknVtx = sknVertex()
-    for idx, vtx in enumerate(vertices):
-        sknVtx.reset()
-        #get position
-        sknVtx.position[0] = vtx[0]
-        sknVtx.position[1] = vtx[1]
-        sknVtx.position[2] = vtx[2]
-        
-        sknVtx.normal[0] = vertexNormals[idx][0]
-        sknVtx.normal[1] = vertexNormals[idx][1]
-        sknVtx.normal[2] = vertexNormals[idx][2]
-
-        #get weights
-        #The SKN format only allows 4 bone weights,
-        #so we'll choose the largest 4 & renormalize
-        #if needed
-        vtxWeights = vertexWeights[idx]
-        if len(vtxWeights) > 4:
-            #Sort by weight in decending order
-            vtxWeights = sorted(vtxWeights, key=lambda t: t[1], reverse=True)
-            
-            #Find sum of four largets weights.
-            tmpSum = 0
-            for k in range(4):
-                tmpSum += vtxWeights[k][1]
-            
-            #Spread remaining weight proportionally across bones
-            remWeight = 1-tmpSum
-            for k in range(4):
-                sknVtx.boneIndex[k] = vtxWeights[k][0]
-                sknVtx.weights[k] = vtxWeights[k][1] + vtxWeights[k][1]*remWeight/tmpSum
+    #get weights
+    #The SKN format only allows 4 bone weights,
+    #so we'll choose the largest 4 & renormalize
+    with lolLog.phase('weights', records=numVertices):
+        vertexWeights = [vertexWeights[v] for v in uniqueVerts.tolist()]
+        influenceCounts = [len(vtxWeights) for vtxWeights in vertexWeights]
+        influences = np.array([gw for vtxWeights in vertexWeights for gw in vtxWeights],
+                dtype=np.float64).reshape(-1, 2)
+        boneIndices, weights, zeroWeight = limitBoneInfluences(
+                np.repeat(np.arange(numVertices), influenceCounts),
+                influences[:, 0], influences[:, 1], numVertices)
+    if zeroWeight.any():
+        log.warning("%d vertices have no bone weights", zeroWeight.sum())
+
+    #Get UV's
+    texcoords = uniqueUvs.copy()
+    texcoords[:, 1] = 1 - texcoords[:, 1]   #flip y-coordinates
 
-        else:
-            #If we have 4 or fewer bone/weight associations,
-            #we have to ensure that the sum of the weights is 1
-            weightSum = 0.0
-            for group, weight in vtxWeights:
-                weightSum += weight
-            
-            for vtxIdx, (group, weight) in enumerate(vtxWeights):
-                sknVtx.boneIndex[vtxIdx] = group
-                sknVtx.weights[vtxIdx] = weight / weightSum
-        
-        #Get UV's
-        sknVtx.texcoords[0] = vertexUvs[idx][0]
-        sknVtx.texcoords[1] = 1 - vertexUvs[idx][1]   #flip y-coordinates
-        
-        if containsVertexColor:
-            sknVtx.vertexColor = vtxColors[idx]
-        
-        #writeout the vertex
-        sknVtx.toFile(sknFid, containsVertexColor)
-    
-    if VERSION >= 2:  # some extra ints in v2+. not sure what they do, non-0 in v4?
-        if header.endTab is None or len(header.endTab) < 3:
-            header.endTab = [0, 0, 0]
-        sknFid.write(struct.pack('<3i', header.endTab[0], header.endTab[1], header.endTab[2]))
+    if containsVertexColor:
+        vertexColors = np.rint(np.clip(np.concatenate(uniqueColors), 0.0, 1.0) * 255.0)
+    else:
+        vertexColors = None
 
-    #Close the output file
-    sknFid.close()
+    sknMesh = SknMesh(indices, exportPositions, normals[uniqueVerts],
+            texcoords, boneIndices, weights, vertexColors, matHeaders)
+
+    #create output file 
+    with lolLog.phase('write', records=numVertices) as p:
+        sknFid = open(output_filepath, 'wb')
+        writeSKN(sknFid, header, meta_data, sknMesh)
+        p.count(bytes=sknFid.tell())
+
+        #Close the output file
+        sknFid.close()
 
     bpy.ops.object.mode_set(mode='OBJECT')
     meshObj.select_set(True)
@@ -771,68 +1268,71 @@ def buildSCO(filename):
     import bpy
     import bmesh
     import mathutils
-    scoObjects = importSCO(filename)
+    with lolLog.phase('parse', bytes=os.path.getsize(filename)) as p:
+        scoObjects = importSCO(filename)
+        p.count(records=sum(len(sco.vtxList) for sco in scoObjects))
 
     for sco in scoObjects:
+        with lolLog.phase('build', records=len(sco.faceList)):
+            #get scene
+            scene=bpy.context.scene
 
-        #get scene
-        scene=bpy.context.scene
+            mesh = bpy.data.meshes.new(sco.name)
+            mesh.from_pydata(sco.vtxList, [], sco.faceList)
+            mesh.update()
 
-        mesh = bpy.data.meshes.new(sco.name)
-        mesh.from_pydata(sco.vtxList, [], sco.faceList)
-        mesh.update()
+            meshObj = bpy.data.objects.new(sco.name, mesh)
 
-        meshObj = bpy.data.objects.new(sco.name, mesh)
+            bpy.context.collection.objects.link(meshObj)
 
-        bpy.context.collection.objects.link(meshObj)
+            bpy.context.view_layer.objects.active = meshObj
 
-        bpy.context.view_layer.objects.active = meshObj
-        
-        bpy.ops.object.mode_set(mode='EDIT')
-        
-        bm = bmesh.from_edit_mesh(mesh)
-        bm.faces.ensure_lookup_table()
-        
-        for matslotIndex, matName in enumerate(sco.materialDict.keys()):
-            #tex = bpy.data.textures.new(matName + '_texImage', type='IMAGE')
-            
-            #mat = bpy.data.materials.new(matName)
-            #mat.use_shadeless = True
-            #mtex = mat.texture_slots.add()
-            #mtex.texture = tex
-            #mtex.texture_coords = 'UV'
-            #mtex.use_map_color_diffuse = True
-            
+            bpy.ops.object.mode_set(mode='EDIT')
 
-            mat = bpy.data.materials.new(name=matName)
-            mat.use_nodes = True
-            bsdf = mat.node_tree.nodes["Principled BSDF"]
-            texImage = mat.node_tree.nodes.new('ShaderNodeTexImage')
-            #texImage.image = bpy.data.images.load("C:\\path\\to\\im.jpg")
-            mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
-            meshObj.data.materials.append(mat)
-            
-            bpy.ops.mesh.select_all(action='DESELECT')
-            meshObj.active_material_index = matslotIndex
-            
-            for faceIndex in sco.materialDict[matName]:
-                bm.faces[faceIndex].select_set(True)
-            
-            bpy.ops.object.material_slot_assign()
-        
-        uvtexName = 'scoUVtex'
-        meshObj.data.uv_layers.new(name=uvtexName)
-        
-        uvLayer = bm.loops.layers.uv[uvtexName]
-        for f in bm.faces:
-            for i, loop in enumerate(f.loops):
-                loop[uvLayer].uv = mathutils.Vector(sco.uvDict[f.index][i])
-        
-        bm.free()
-        bpy.ops.object.mode_set(mode='OBJECT')
+            bm = bmesh.from_edit_mesh(mesh)
+            bm.faces.ensure_lookup_table()
+
+            with lolLog.phase('materials', records=len(sco.materialDict)):
+                for matslotIndex, matName in enumerate(sco.materialDict.keys()):
+                    #tex = bpy.data.textures.new(matName + '_texImage', type='IMAGE')
+
+                    #mat = bpy.data.materials.new(matName)
+                    #mat.use_shadeless = True
+                    #mtex = mat.texture_slots.add()
+                    #mtex.texture = tex
+                    #mtex.texture_coords = 'UV'
+                    #mtex.use_map_color_diffuse = True
+
+
+                    mat = bpy.data.materials.new(name=matName)
+                    mat.use_nodes = True
+                    bsdf = mat.node_tree.nodes["Principled BSDF"]
+                    texImage = mat.node_tree.nodes.new('ShaderNodeTexImage')
+                    #texImage.image = bpy.data.images.load("C:\\path\\to\\im.jpg")
+                    mat.node_tree.links.new(bsdf.inputs['Base Color'], texImage.outputs['Color'])
+                    meshObj.data.materials.append(mat)
+
+                    bpy.ops.mesh.select_all(action='DESELECT')
+                    meshObj.active_material_index = matslotIndex
+
+                    for faceIndex in sco.materialDict[matName]:
+                        bm.faces[faceIndex].select_set(True)
+
+                    bpy.ops.object.material_slot_assign()
+
+            uvtexName = 'scoUVtex'
+            meshObj.data.uv_layers.new(name=uvtexName)
+
+            uvLayer = bm.loops.layers.uv[uvtexName]
+            for f in bm.faces:
+                for i, loop in enumerate(f.loops):
+                    loop[uvLayer].uv = mathutils.Vector(sco.uvDict[f.index][i])
+
+            bm.free()
+            bpy.ops.object.mode_set(mode='OBJECT')
+
+            mesh.update()
 
-        mesh.update()
-        
 def exportSCO(meshObj, output_filepath):
     import bpy
     import mathutils
@@ -853,7 +1353,6 @@ def exportSCO(meshObj, output_filepath):
         vertexList.append(vert.co.copy())
         centralpoint += vert.co
     centralpoint /= vertCount
-    print(vertexList[0])
     bpy.ops.object.mode_set(mode='EDIT')
     bm = bmesh.from_edit_mesh(mesh)
     
@@ -892,9 +1391,6 @@ def exportSCO(meshObj, output_filepath):
     scoFid.write('Name= ' + scoName + '\n')
     scoFid.write('CentralPoint= ' + '{:.4f}'.format(centralpoint[0]) + ' ' + '{:.4f}'.format(centralpoint[1]) + ' ' + '{:.4f}'.format(centralpoint[2]) + '\n')
     scoFid.write('Verts= ' + str(vertCount) + '\n')
-    print(vertexList[0])
-    print(vertexList[0][1])
-    print('{:.4f}'.format(vertexList[0][1]))
     for vert in vertexList:
         scoFid.write('{:.4f}'.format(vert[0]) + ' ' + '{:.4f}'.format(vert[1]) + ' ' + '{:.4f}'.format(vert[2]) + '\n')
     
@@ -922,15 +1418,14 @@ def exportSCO(meshObj, output_filepath):
     scoFid.write('[ObjectEnd]\n\n')
 
 if __name__ == '__main__':
-    (header, materials, numIndices, 
-            numVertices, indices, vertices) = importSKN(testFile)
+    (header, materials, metaData, mesh) = importSKN(testFile)
 
     print(header)
     print(materials)
-    print(numIndices)
-    print(numVertices)
-    print(indices[0])
-    print(vertices[0])
+    print(mesh.numIndices)
+    print(mesh.numVertices)
+    print(mesh.indices[0])
+    print(mesh.positions[0])
 
     #print('Checking bone indices')
     #i = 0
@@ -16,8 +16,45 @@
 # ##### END GPL LICENSE BLOCK #####
 
 # <pep8 compliant>
+import mmap
+import os
 import struct
-import mathutils
+import numpy as np
+from . import lolLog
+try:
+    import mathutils
+except ImportError:
+    #Running outside of Blender, e.g. from the command line tools.  Only
+    #sklBone's v0 quaternions need the standalone mathutils module
+    mathutils = None
+
+log = lolLog.getLogger(__name__)
+
+#Binary layout of one v1-2 bone record, see sklBone
+sklBoneDtype = np.dtype([
+    ('name', 'S32'),
+    ('parent', '<i4'),
+    ('scale', '<f4'),
+    ('matrix', '<f4', (3, 4)),
+    ])
+
+#Binary layout of one v0 bone record, see sklBone
+sklBoneDtypeV0 = np.dtype([
+    ('zero', '<i2'),
+    ('id', '<i2'),
+    ('parent', '<i2'),
+    ('unknown', '<i2'),
+    ('nameHash', '<i4'),
+    ('twoPointOne', '<f4'),
+    ('position', '<f4', (3,)),
+    ('scale', '<f4', (3,)),
+    ('orientation', '<f4', (4,)),
+    ('ct', '<f4', (3,)),
+    ('extra', '<f4', (8,)),
+    ])
+
+#Negates the z row of [..., 3, 4] bone matrices, SKL <-> Blender
+_flipZ = np.array([[1.0], [1.0], [-1.0]], dtype=np.float32)
 
 class sklHeader():
     """LoL skeleton header format:
@@ -201,101 +238,410 @@ class sklBone():
             pass
         return newBone
 
+class SklSkeleton():
+    '''The bones of a skeleton as arrays, instead of one sklBone per bone:
+        version     SKL version the bones come from
+        names       list of bone names
+        parents     int32[numBones], -1 for root bones
+        scales      float32[numBones] (v1-2), float32[numBones, 3] (v0)
+
+    v1-2 store every bone's transform in model space:
+        matrices    float32[numBones, 3, 4] with the z row negated
+
+    v0 store it relative to the parent bone:
+        positions   float32[numBones, 3] with z negated
+        quats       float32[numBones, 4] as (w, x, y, z)
+        cts         float32[numBones, 3] with y and z negated
+    '''
+    __slots__ = ('version', 'names', 'parents', 'scales', 'matrices',
+            'positions', 'quats', 'cts')
+    #the attributes holding arrays, None where a version has no such data
+    ARRAYS = ('parents', 'scales', 'matrices', 'positions', 'quats', 'cts')
+
+    def __init__(self, version, names, parents, scales, matrices=None,
+            positions=None, quats=None, cts=None):
+        self.version = version
+        self.names = list(names)
+        self.parents = np.ascontiguousarray(parents, dtype=np.int32)
+        self.scales = np.ascontiguousarray(scales, dtype=np.float32)
+        self.matrices = matrices
+        self.positions = positions
+        self.quats = quats
+        self.cts = cts
+        for name in ['matrices', 'positions', 'quats', 'cts']:
+            if getattr(self, name) is not None:
+                setattr(self, name, np.ascontiguousarray(getattr(self, name),
+                        dtype=np.float32))
+
+    @classmethod
+    def fromRecords(cls, records, version=2):
+        '''Builds the skeleton of a structured v1-2 bone block (see
+        sklBoneDtype), flipping the z axis'''
+        names = [bytes.decode(name).rstrip('\0') for name in records['name'].tolist()]
+        return cls(version, names, records['parent'], records['scale'],
+                matrices=records['matrix'] * _flipZ)
+
+    def toRecords(self):
+        '''The v1-2 bone block of the skeleton, z axis flipped back'''
+        if self.matrices is None:
+            raise ValueError("Only v1-2 skeletons have bone matrices")
+        records = np.zeros(len(self), dtype=sklBoneDtype)
+        records['name'] = [name.encode() for name in self.names]
+        records['parent'] = self.parents
+        records['scale'] = self.scales
+        records['matrix'] = self.matrices * _flipZ
+        return records
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def numBones(self):
+        return len(self.names)
+
+def quatMatrices(quats):
+    '''Rotation matrices [n, 3, 3] of (w, x, y, z) quaternions, normalized
+    first'''
+    quats = np.asarray(quats, dtype=np.float64)
+    w, x, y, z = (quats / np.linalg.norm(quats, axis=-1, keepdims=True)).T
+    return np.stack([
+        np.stack([1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)], -1),
+        np.stack([2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)], -1),
+        np.stack([2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)], -1),
+        ], 1)
+
+class SkeletonIndex():
+    '''The bone hierarchy of a skeleton, built once for everything that walks
+    it instead of searching the bones by name or parent:
+        names       list of bone names
+        ids         dict bone name -> bone id (the first bone of that name)
+        parents     int32[numBones], -1 for root bones
+        childStarts int32[numBones + 1], the children of bone k are
+        childIds        childIds[childStarts[k]:childStarts[k + 1]]
+        levels      list of int32 arrays: the root bones, their children,
+                    their grandchildren...
+        order       int32[numBones], the levels concatenated, so every
+                    parent comes before its children
+        depths      int32[numBones], the level of every bone
+
+    and the bone transforms as float64[numBones, 4, 4] stacks, in the space
+    of the source (z flipped for SKL files, armature space for Blender):
+        localMatrices   relative to the parent bone, to the model for roots
+        globalMatrices  relative to the model
+        inverseBinds    the inverse of every global matrix
+
+    Give either localMatrices or globalMatrices (identity bones without
+    either), the other two are derived level by level.
+    '''
+    def __init__(self, names, parents, localMatrices=None, globalMatrices=None):
+        self.names = list(names)
+        numBones = len(self.names)
+        self.ids = {}
+        for boneId, name in enumerate(self.names):
+            self.ids.setdefault(name, boneId)
+        self.parents = np.ascontiguousarray(parents, dtype=np.int32)
+        if len(self.parents) != numBones:
+            raise ValueError("%d parents for %d bones" % (len(self.parents), numBones))
+        if ((self.parents < -1) | (self.parents >= numBones)).any():
+            raise ValueError("Bone parent out of range")
+
+        #children grouped by parent, the roots (parent -1) sort first
+        byParent = np.argsort(self.parents, kind='stable').astype(np.int32)
+        isChild = self.parents >= 0
+        self.childIds = byParent[numBones - np.count_nonzero(isChild):]
+        self.childStarts = np.zeros(numBones + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.parents[isChild], minlength=numBones),
+                out=self.childStarts[1:])
+
+        self.depths = np.full(numBones, -1, dtype=np.int32)
+        self.levels = []
+        level = np.flatnonzero(~isChild).astype(np.int32)
+        while len(level):
+            self.depths[level] = len(self.levels)
+            self.levels.append(level)
+            level = np.flatnonzero(np.isin(self.parents, level)).astype(np.int32)
+        if (self.depths < 0).any():
+            raise ValueError("Bone hierarchy has a cycle through bone %s" %
+                    self.names[np.flatnonzero(self.depths < 0)[0]])
+        self.order = np.concatenate(self.levels) if self.levels else \
+                np.empty(0, dtype=np.int32)
+
+        if globalMatrices is not None:
+            self.globalMatrices = np.array(globalMatrices, dtype=np.float64)
+            self.inverseBinds = np.linalg.inv(self.globalMatrices)
+            self.localMatrices = self.globalMatrices.copy()
+            self.localMatrices[isChild] = \
+                    self.inverseBinds[self.parents[isChild]] @ \
+                    self.globalMatrices[isChild]
+        else:
+            if localMatrices is None:
+                localMatrices = np.tile(np.eye(4), (numBones, 1, 1))
+            self.localMatrices = np.array(localMatrices, dtype=np.float64)
+            self.globalMatrices = self.localMatrices.copy()
+            for level in self.levels[1:]:
+                self.globalMatrices[level] = \
+                        self.globalMatrices[self.parents[level]] @ \
+                        self.localMatrices[level]
+            self.inverseBinds = np.linalg.inv(self.globalMatrices)
+
+    @classmethod
+    def fromSkeleton(cls, skeleton):
+        '''The index of a SklSkeleton, as returned by importSKL'''
+        numBones = len(skeleton)
+        transforms = np.tile(np.eye(4), (numBones, 1, 1))
+        if skeleton.matrices is not None:
+            transforms[:, :3, :] = skeleton.matrices
+            return cls(skeleton.names, skeleton.parents, globalMatrices=transforms)
+        #v0 bones are placed relative to their parent
+        transforms[:, :3, :3] = quatMatrices(skeleton.quats)
+        transforms[:, :3, 3] = skeleton.positions
+        return cls(skeleton.names, skeleton.parents, localMatrices=transforms)
+
+    @classmethod
+    def fromArmature(cls, armature, edit=False):
+        '''The index of a Blender armature (the data, not the object), of its
+        edit bones if edit is set'''
+        if edit:
+            bones = list(armature.edit_bones)
+            transforms = [b.matrix for b in bones]
+        else:
+            bones = list(armature.bones)
+            transforms = [b.matrix_local for b in bones]
+        names = [b.name for b in bones]
+        ids = {name: boneId for boneId, name in enumerate(names)}
+        parents = [ids[b.parent.name] if b.parent is not None else -1
+                for b in bones]
+        return cls(names, parents, globalMatrices=np.array(transforms,
+                dtype=np.float64).reshape(len(bones), 4, 4))
+
+    def children(self, boneId):
+        '''Ids of the direct children of a bone'''
+        return self.childIds[self.childStarts[boneId]:self.childStarts[boneId + 1]]
+
+    def __len__(self):
+        return len(self.names)
+
+def peekSKL(filepath):
+    '''Reads only the header of a SKL file, none of the bones.
+
+    Returns a dict with the parsed 'header', the counts and the byte offsets
+    of the sections.  For v1-2 numBoneIDs is the size of the reordered bone
+    list (v2 only, 0 for v1).'''
+    header = sklHeader()
+    with open(filepath, 'rb') as sklFid:
+        header.fromFile(sklFid)
+        fileSize = os.fstat(sklFid.fileno()).st_size
+        peek = {'header': header,
+                'version': header.version,
+                'numBones': header.numBones,
+                'fileSize': fileSize}
+        if header.version in [1, 2]:
+            boneOffset = sklFid.tell()
+            reorderOffset = boneOffset + header.numBones * 88
+            numBoneIDs = 0
+            if header.version == 2 and fileSize >= reorderOffset + 4:
+                sklFid.seek(reorderOffset)
+                numBoneIDs = struct.unpack('<i', sklFid.read(4))[0]
+            peek.update({'skeletonHash': header.skeletonHash,
+                    'numBoneIDs': numBoneIDs,
+                    'boneOffset': boneOffset,
+                    'reorderOffset': reorderOffset})
+        elif header.version == 0:
+            peek.update({'numBoneIDs': header.numBoneIDs,
+                    'boneOffset': header.offsetVertexData,
+                    'boneIDMapOffset': header.offset1,
+                    'animationIndexOffset': header.offsetAnimationIndices,
+                    'stringOffset': header.offsetToStrings})
+        else:
+            raise ValueError("Version %i not supported" % header.version)
+    return peek
+
+def readSKLBoneNames(filepath, peek=None):
+    '''Reads only the bone names of a SKL file, in bone order'''
+    if peek is None:
+        peek = peekSKL(filepath)
+    numBones = peek['numBones']
+    with open(filepath, 'rb') as sklFid:
+        if peek['version'] in [1, 2]:
+            sklFid.seek(peek['boneOffset'])
+            rawNames = readSKLBoneRecords(sklFid, numBones)['name'].tolist()
+            return [bytes.decode(name).rstrip('\0') for name in rawNames]
+        sklFid.seek(peek['stringOffset'])
+        return splitSKLNames(sklFid.read(), numBones)
+
+def splitSKLNames(strings, numBones, offset=0):
+    '''Cuts the v0 string table, numBones null terminated names that are
+    each padded to a multiple of 4 bytes, starting at offset of strings'''
+    rawNames = []
+    start = offset
+    for k in range(numBones):
+        end = strings.find(b'\0', start)
+        if end < 0:
+            raise ValueError("String table truncated after %d names" % k)
+        rawNames.append(strings[start:end])
+        start = offset + ((end - offset) // 4 + 1) * 4
+    return [bytes.decode(name) for name in rawNames]
+
+def readSKLBoneRecords(sklFid, numBones):
+    '''Reads numBones v1-2 bone records as one structured array'''
+    size = numBones * sklBoneDtype.itemsize
+    buf = sklFid.read(size)
+    if len(buf) != size:
+        raise ValueError("Bone block truncated, expected %d bytes got %d" % (size, len(buf)))
+    return np.frombuffer(buf, dtype=sklBoneDtype)
+
+def _sectionArray(data, offset, dtype, count, section):
+    '''count items of dtype at offset of data, copied out of the buffer'''
+    dtype = np.dtype(dtype)
+    if offset < 0 or offset + count * dtype.itemsize > len(data):
+        raise ValueError("%s truncated, expected %d bytes at %d" % (section,
+                count * dtype.itemsize, offset))
+    return np.frombuffer(data, dtype=dtype, count=count, offset=offset).copy()
+
+def _decodeSKLv0(data, header):
+    numBones = header.numBones
+    records = _sectionArray(data, header.offsetVertexData, sklBoneDtypeV0,
+            numBones, "Bone block")
+    # indices for version 4 animation, rows of (sklID, anmID)
+    boneIDMap = _sectionArray(data, header.offset1, '<i4', 2 * numBones,
+            "Bone id map").reshape(numBones, 2).astype(np.int32)
+    boneIds = _sectionArray(data, header.offsetAnimationIndices, '<i2',
+            header.numBoneIDs, "Animation indices").astype(np.int32)
+    names = splitSKLNames(data, numBones, header.offsetToStrings)
+
+    parents = records['parent'].astype(np.int32)
+    if ((parents < -1) | (parents >= numBones)).any() or \
+            ((boneIds < 0) | (boneIds >= numBones)).any():
+        raise ValueError("Bone index out of range")
+
+    #make z negative, the quaternion (x, y, z, w) becomes (-w, x, y, -z)
+    orientation = records['orientation']
+    quats = np.column_stack((-orientation[:, 3], orientation[:, 0],
+            orientation[:, 1], -orientation[:, 2]))
+    skeleton = SklSkeleton(0, names, parents, records['scale'],
+            positions=records['position'] * np.float32([1, 1, -1]),
+            quats=quats,
+            cts=records['ct'] * np.float32([1, -1, -1]))
+    return skeleton, boneIds, boneIDMap
+
+def readSKLv0(sklFid, header):
+    '''Reads the bones of a v0 SKL file whose header was read into header.
+    The file is mapped once and every section decoded as one array.
+
+    Returns (skeleton, boneIds, boneIDMap): boneIds are the animation
+    indices (the reordered bone list), boneIDMap the (sklID, anmID) rows
+    used by v4 animations.'''
+    with mmap.mmap(sklFid.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _decodeSKLv0(data, header)
+
 def importSKL(filepath):
+    '''Reads a SKL file.  Returns (header, skeleton, boneIds): skeleton is a
+    SklSkeleton and boneIds the reordered bone list, the bone id of every
+    vertex bone index as an int32 array (empty for v1, whose vertices use
+    the bone ids directly).'''
     header = sklHeader()
-    boneList= []
-    reorderedBoneList = []
+    boneIds = np.empty(0, dtype=np.int32)
     
     #Wrap open in try block
     sklFid = open(filepath, 'rb')
-    print("Reading SKL: %s" % filepath)
+    log.debug("Reading SKL: %s", filepath)
     #Read the file header to get # of bones
     header.fromFile(sklFid)
-    print("SKL version:%s" % header.version)
+    log.debug("SKL version: %s", header.version)
     if header.version in [1, 2]:
         #Read in the bones
-        for k in range(header.numBones):
-            boneList.append(sklBone())
-            boneList[k].fromFile(sklFid, header.version)
-        
-
+        skeleton = SklSkeleton.fromRecords(
+                readSKLBoneRecords(sklFid, header.numBones), header.version)
 
         if header.version == 2:  # version 2 has a reordered bone list
             #Read in reordered bone assignments
             numBoneIDs = struct.unpack('<i', sklFid.read(4))[0]  # clue taken from LolViewer
-            print ("reordered list size: %i" % numBoneIDs)
-            for i in range(0, numBoneIDs):
-                buf = sklFid.read(4)
-                if buf == b'':
-                    break
-                else:
-                    boneId = struct.unpack('<i', buf)[0]
-                reorderedBoneList.append(boneList[boneId].copy())
+            log.debug("reordered list size: %i", numBoneIDs)
+            #a short list ends where the file does
+            buf = sklFid.read(4 * numBoneIDs)
+            boneIds = np.frombuffer(buf, dtype='<i4', count=len(buf) // 4).astype(np.int32)
+            if ((boneIds < 0) | (boneIds >= header.numBones)).any():
+                raise ValueError("Reordered bone list out of range")
             
     elif header.version == 0:
         # taken from c# code from LoLViewer
-        for k in range(header.numBones):
-            boneList.append(sklBone())
-            boneList[k].fromFile(sklFid, header.version)
-        print("(off1) from %s to %s" % (sklFid.tell(), header.offset1))
-        sklFid.seek(header.offset1)
-        # indices for version 4 animation
-        header.boneIDMap = {}
-        for i in range(0, header.numBones):
-            # 8 bytes
-            sklID, anmID = struct.unpack('<2i', sklFid.read(
-                    struct.calcsize('<2i')))
-            header.boneIDMap[anmID] = sklID
-
-
-        print("(offstr) from %s to %s" % (sklFid.tell(), header.offsetToStrings))
-        sklFid.seek(header.offsetToStrings)
-        for i in range(0, header.numBones):
-            name = []
-            while name.count(b'\0') == 0:
-                for j in range(0,4):
-                    name.append(sklFid.read(1))
-            end = name.index(b'\0')
-            boneList[i].name = ''.join(
-                    v.decode() for v in name[0:end])
-            DEBUG_PRINT = False
-            if DEBUG_PRINT and boneList[i].name.lower() in ['root', 'r_weapon', 'shield',
-                    'l_shield', 'r_shield', 'buffbone_cstm_shield_top',
-                    'buffbone_glb_weapon_1', 'l_hip']:
-                bone = boneList[i]
-                print("%s:" % bone.name)
-                print("p:%s" % bone.position)
-                print("ct:%s" % bone.ct)
-                print("q:%s" % bone.quat)
-                if bone.parent > -1:
-                    tct = mathutils.Vector(bone.ct)
-                    tct.rotate(boneList[bone.parent].quat)
-                    print("tct:%s" % tct)
-
-                print("Mags: p:%f, ct:%f" % (mathutils.Vector(
-                        bone.position).length, mathutils.Vector(
-                        bone.ct).length))
-                # print("ex:%s" % boneList[i].extra)
-
-        # below is technically earlier in file than above
-        print("(offani) from %s to %s" % (sklFid.tell(), header.offsetAnimationIndices))
-        sklFid.seek(header.offsetAnimationIndices)
-        for i in range(0, header.numBoneIDs):
-            boneId = struct.unpack('<h', sklFid.read(
-                    struct.calcsize('<h')))[0]
-            reorderedBoneList.append(boneList[boneId].copy())
-        print("end: %s" % sklFid.tell())
+        skeleton, boneIds, header.boneIDMap = readSKLv0(sklFid, header)
     else:
         raise ValueError("Version %i not supported" % header.version)
 
     sklFid.close()
-    return header, boneList, reorderedBoneList
+    return header, skeleton, boneIds
 
-def buildSKL(boneList, version):
+def writeSKL(sklFid, header, skeleton, boneIds=None):
+    '''Writes a v1-2 SKL file: header, the bone block in one write and, if
+    given, the reordered bone list'''
+    header.toFile(sklFid)
+    sklFid.write(skeleton.toRecords().tobytes())
+    if boneIds is not None:
+        boneIds = np.asarray(boneIds, dtype='<i4')
+        sklFid.write(struct.pack('<i', len(boneIds)))
+        sklFid.write(boneIds.tobytes())
+
+#Thresholds of Blender's vec_roll_to_mat3_normalized: above the safe one
+#theta = 1 + y is precise enough, below the critical distance from the y
+#axis a bone points straight down -y
+_ROLL_SAFE_THRESHOLD = 6.1e-3
+_ROLL_CRITICAL_THRESHOLD = 2.5e-4
+
+def rollZeroAxes(directions):
+    '''The x axes [n, 3] Blender gives bones pointing along the unit
+    directions [n, 3] when their roll is 0, as vec_roll_to_mat3_normalized
+    computes them'''
+    x, y, z = np.asarray(directions, dtype=np.float64).T
+    theta = 1 + y
+    thetaAlt = x * x + z * z
+    regular = (theta > _ROLL_SAFE_THRESHOLD) | \
+            (thetaAlt > _ROLL_CRITICAL_THRESHOLD ** 2)
+    #close to -y theta is imprecise, use the Taylor expansion of 1 - cos
+    theta = np.where(theta > _ROLL_SAFE_THRESHOLD, theta,
+            thetaAlt / 2 + thetaAlt * thetaAlt / 8)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        axes = np.stack([1 - x * x / theta, -x, -x * z / theta], -1)
+    #pointing straight down -y, mirrored by the z axis
+    axes[~regular] = (-1.0, 0.0, 0.0)
+    return axes
+
+def armatureBones(skeleton, index=None):
+    '''The edit bones of a SklSkeleton, for all bones at once: returns
+    (heads, tails, rolls) as float64 arrays [numBones, 3], [numBones, 3] and
+    [numBones].  v1-2 bones are 3 units long, v0 bones 1 unit; their global
+    transforms are composed level by level in the SkeletonIndex.'''
+    if index is None:
+        index = SkeletonIndex.fromSkeleton(skeleton)
+    boneLength = 3 if skeleton.version in [1,2] else 1
+    heads = index.globalMatrices[:, :3, 3]
+    #the x and y axes the bones should get
+    newRollVecs = index.globalMatrices[:, :3, 0]
+    rotVectors = index.globalMatrices[:, :3, 1]
+    tails = heads + rotVectors * boneLength
+
+    #the x axes the bones get from head and tail alone, at roll 0
+    lengths = np.linalg.norm(rotVectors, axis=1, keepdims=True)
+    oldRollVecs = rollZeroAxes(rotVectors / np.where(lengths > 0, lengths, 1))
+
+    #the signed angle between them around the y axis, see
+    #https://stackoverflow.com/questions/5188561/signed-angle-between-two-3d-vectors-with-same-origin-within-the-same-plane
+    rolls = np.arctan2(
+            np.einsum('ij,ij->i', np.cross(oldRollVecs, newRollVecs), rotVectors),
+            np.einsum('ij,ij->i', oldRollVecs, newRollVecs))
+    return heads, tails, rolls
+
+def buildSKL(skeleton, index=None):
+    '''Creates an armature of a SklSkeleton.  index is its SkeletonIndex,
+    built here if not given.  The bone math is done by armatureBones, the
+    edit bones only get the results.'''
     import bpy
     import math
-    import mathutils
     
+    if index is None:
+        index = SkeletonIndex.fromSkeleton(skeleton)
+    heads, tails, rolls = armatureBones(skeleton, index)
+
     #Create Blender Armature
     bpy.ops.object.armature_add(location=(0,0,0), enter_editmode=True, rotation=(math.radians(90), 0, 0))
     obj = bpy.context.active_object
@@ -306,96 +652,25 @@ def buildSKL(boneList, version):
     bones.remove(bones[0])
     #import the bones
 
-    print(len(boneList))
-    # print("%s, p:%s" % (boneName, boneList[bone.parent].name if bone.parent > -1 else None))
-
-    if version in [1,2]:
-        for boneID, bone in enumerate(boneList):
-            boneName = bone.name.rstrip('\x00')
-            newBone = arm.edit_bones.new(boneName)
-            
-            boneMatrix = mathutils.Matrix()
-            for x in range(4):
-                for y in range(3):
-                    boneMatrix[y][x] = bone.matrix[y][x]
-            
-            newBone.head = (bone.matrix[0][3], bone.matrix[1][3], bone.matrix[2][3])
-            
-            #rotVector is the y-Axis of the bone
-            rotVector = mathutils.Vector((bone.matrix[0][1], bone.matrix[1][1], bone.matrix[2][1]))
-            newBone.tail = newBone.head + rotVector * 3
-            
-            #calculate the roll of the bone based on the x-Vector the bone has before the roll is applied
-            #and the x-Vector it should have after applying it
-            newRollVec = mathutils.Vector([bone.matrix[0][0], bone.matrix[1][0], bone.matrix[2][0]])
-            oldRollVec = mathutils.Vector([newBone.matrix[0][0], newBone.matrix[1][0], newBone.matrix[2][0]])
-            normal = mathutils.Vector((bone.matrix[0][1], bone.matrix[1][1], bone.matrix[2][1]))
-            
-            #https://stackoverflow.com/questions/5188561/signed-angle-between-two-3d-vectors-with-same-origin-within-the-same-plane
-            roll = math.atan2(oldRollVec.cross(newRollVec) @ normal, oldRollVec @ newRollVec)
-            
-            newBone.roll = roll
-            
-            boneParentID = bone.parent
-            
-            if boneParentID > -1:
-                boneParentName = boneList[boneParentID].name
-                parentBone = arm.edit_bones[boneParentName]
-                newBone.parent = parentBone
-
-    elif version == 0:
-
-        for boneID, bone in enumerate(boneList):
-            #algorithm here based off of above, and LolViewer code
-            #If this bone is a child, find the parent's tail and attach this bone's
-            #head to it
-            parentPos = mathutils.Vector([0,0,0])
-            boneHead = mathutils.Vector(bone.position)
-
-            boneParentID = bone.parent
-            boneName = bone.name.rstrip('\x00')
-            # debug
-            # if boneName.count("weapon"):
-            #     print("prev: %s" % boneList[boneID-1].name)
-            #     print("%s, id:%s\np:%s\nq:%s\ns:%s" % (bone.name, boneID, bone.position, bone.quat, bone.scale))
-            #     print("c%s" % bone.ct)
-            #     # print("E%s" % bone.extra)
-            newBone = arm.edit_bones.new(boneName)
-            if boneParentID > -1:
-                boneParentName = boneList[boneParentID].name
-                parentBone = arm.edit_bones[boneParentName]
-
-                newBone.parent = parentBone
-                parQuat = boneList[boneParentID].quat
-                boneHead.rotate(parQuat)  # only apply parent rotation to self
-                bone.quat = parQuat @ bone.quat  # for children
-
-                # parentPos = mathutils.Vector(boneList[boneParentID].position)
-                parentPos = parentBone.head
-            newBone.head = parentPos + boneHead
-            boneMatrix = bone.quat.to_matrix()
-            newBone.tail = newBone.head + mathutils.Vector([boneMatrix[0][1],boneMatrix[1][1],boneMatrix[2][1]])
-            
-            newRollVec = mathutils.Vector([boneMatrix[0][0], boneMatrix[1][0], boneMatrix[2][0]])
-            oldRollVec = mathutils.Vector([newBone.matrix[0][0], newBone.matrix[1][0], newBone.matrix[2][0]])
-            normal = mathutils.Vector((boneMatrix[0][1], boneMatrix[1][1], boneMatrix[2][1]))
-            #https://stackoverflow.com/questions/5188561/signed-angle-between-two-3d-vectors-with-same-origin-within-the-same-plane
-            roll = math.atan2(oldRollVec.cross(newRollVec) @ normal, oldRollVec @ newRollVec)
-            
-            newBone.roll = roll
-
-        # set bones with children to be average of the
-        # for boneID, bone in enumerate(boneList):
-        #     numChildren = len(children[boneID]['all'])
-        #     if numChildren > 0:
-        #         pos = mathutils.Vector([0,0,0])
-        #         for b in children[boneID]['all']:
-        #             pos += arm.edit_bones[b].head/numChildren
-        #         arm.edit_bones[bone.name].tail = pos
+    log.debug("Building %d bones", len(skeleton))
+    newBones = []
+    for boneName, head, tail, roll in zip(skeleton.names, heads.tolist(),
+            tails.tolist(), rolls.tolist()):
+        newBone = bones.new(boneName)
+        newBone.head = head
+        newBone.tail = tail
+        newBone.roll = roll
+        newBones.append(newBone)
+
+    #every bone exists now, so parents may come after their children
+    for boneID, boneParentID in enumerate(index.parents.tolist()):
+        if boneParentID > -1:
+            newBones[boneID].parent = newBones[boneParentID]
 
     bpy.ops.object.mode_set(mode='OBJECT')
     obj.select_set(True)
     bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
+    return index
 
 
 def exportSKL(meshObj, skelObj, output_filepath, input_filepath):
@@ -405,60 +680,34 @@ def exportSKL(meshObj, skelObj, output_filepath, input_filepath):
     bpy.ops.object.select_all(action='DESELECT')
     skelObj.select_set(True)
     
-    objBones = skelObj.data.bones
-    numBones = len(objBones)
-    bones = []
-    
-    for b in objBones:
-        bones.append(sklBone())
-        bones[-1].name = b.name
-        if b.parent != None:
-            for boneId, bone in enumerate(objBones):
-                if b.parent == bone:
-                    bones[-1].parent = boneId
-                    break
-        else:
-            bones[-1].parent = -1
-        bones[-1].scale = 0.1 #this value is always 0.1 ?
-        bones[-1].matrix = b.matrix_local
-        
-        for k in range(3):
-            bones[-1].matrix[k][2] = -bones[-1].matrix[k][2]
-        for k in range(4):
-            bones[-1].matrix[2][k] = -bones[-1].matrix[2][k]
-    
+    index = SkeletonIndex.fromArmature(skelObj.data)
+    numBones = len(index)
+
+    #SklSkeleton matrices are z flipped like the imported ones, from the
+    #armature's bone space that is a negated z column (writeSKL flips the
+    #z row back)
+    matrices = index.globalMatrices[:, :3, :].astype(np.float32)
+    matrices[:, :, 2] *= -1
     
-    (import_header, import_boneList, import_reorderedBoneList) = importSKL(input_filepath)
-    
-    header = import_header
+    #only the header is reused, no need to read the bones
+    header = peekSKL(input_filepath)['header']
     
     header.numBones = numBones
     
     if header.version in [1,2]:
-        numReorderedBones = len(meshObj.vertex_groups)
         reorderedBoneList = []
         
         for g in meshObj.vertex_groups:
-            groupName = g.name
-            for boneIndex, bone in enumerate(objBones):
-                if bone == objBones[groupName]:
-                    index = boneIndex
-                    break
-            
-            reorderedBoneList.append(index)
+            if g.name not in index.ids:
+                raise ValueError("Vertex group %s has no bone" % g.name)
+            reorderedBoneList.append(index.ids[g.name])
     else:
         raise ValueError("Version %d not supported!" % header.version)
+
+    #this value is always 0.1 ?
+    skeleton = SklSkeleton(header.version, index.names, index.parents,
+            np.full(numBones, 0.1), matrices)
     
     sklFid = open(output_filepath, 'wb')
-    
-    header.toFile(sklFid)
-    
-    for b in bones:
-        b.toFile(sklFid)
-    
-    sklFid.write(struct.pack('<1i', numReorderedBones))
-    
-    for b in reorderedBoneList:
-        sklFid.write(struct.pack('<1i', b))
-    
+    writeSKL(sklFid, header, skeleton, reorderedBoneList)
     sklFid.close()
\ No newline at end of file